@@ -0,0 +1,234 @@
+import curses
+
+from functools import lru_cache
+
+from ConsoleOutput import CSI, RGB, ConsoleOutput, color_params
+
+Color = int | RGB | None  # palette index, 24-bit color or terminal default
+Style = tuple[Color, Color]  # (foreground, background)
+
+DEFAULT_STYLE: Style = (None, None)
+
+
+def parse_attr(attr, pairs: dict[int, Style]) -> Style:
+    """
+    Style for an (r, g, b) color, a (foreground, background) pair, or a
+    curses attribute whose color pair is looked up in pairs (pair n defaults
+    to palette color n on n, like main() sets up)
+    """
+    if isinstance(attr, tuple):
+        if len(attr) == 3:
+            return (attr, attr)  # solid 24-bit color
+        return attr
+    pair = (attr & curses.A_COLOR) >> 8
+    return pairs.get(pair, (pair, pair))
+
+
+@lru_cache(maxsize=1024)
+def sgr_transition(previous: Style, style: Style) -> str:
+    """
+    Shortest SGR sequence turning the previous style into the new one
+    """
+    params = []
+    (prev_fg, prev_bg), (fg, bg) = previous, style
+    if fg != prev_fg:
+        params.extend((39,) if fg is None else color_params(fg))
+    if bg != prev_bg:
+        params.extend((49,) if bg is None else color_params(bg, background=True))
+    return f"{CSI}{';'.join(map(str, params))}m"
+
+
+class AnsiScreen:
+    """
+    Drop-in replacement for the parts of curses.window that VirtualCanvas
+    draws with. Cells are kept in a back buffer and refresh() sends only the
+    cells that changed since the last frame, straight to the terminal as
+    ANSI escape sequences:
+      - colors are 24-bit (38;2 / 48;2) when given as (r, g, b) tuples
+      - cursor moves are skipped for adjacent cells and shortened when possible
+      - SGR state is carried from cell to cell, unchanged attributes are not
+        re-emitted
+      - the frame is assembled in one bytearray and written with one syscall
+
+    Attributes may be anything parse_attr understands, with curses color
+    pairs mapped through init_pair.
+    """
+
+    truecolor = True
+
+    def __init__(self, height: int, width: int, output: ConsoleOutput = None) -> None:
+        self.height = height
+        self.width = width
+        self.output = ConsoleOutput() if output is None else output
+        self.cursor_y = 0
+        self.cursor_x = 0
+        self.cursor_visible = False
+        self._pairs: dict[int, Style] = {0: DEFAULT_STYLE}
+
+        # Back buffer (what is being drawn) and front buffer (what the
+        # terminal is showing), one list per row
+        self._chars = [[" "] * width for _ in range(height)]
+        self._styles = [[DEFAULT_STYLE] * width for _ in range(height)]
+        self._front_chars = [[None] * width for _ in range(height)]
+        self._front_styles = [[None] * width for _ in range(height)]
+        self._dirty_rows = set(range(height))
+        self._clear_terminal = True
+
+    # curses.window interface
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def getyx(self) -> tuple[int, int]:
+        return self.cursor_y, self.cursor_x
+
+    def move(self, y: int, x: int) -> None:
+        self._check_position(y, x)
+        self.cursor_y, self.cursor_x = y, x
+
+    def chgat(self, y: int, x: int, num: int, attr) -> None:
+        self.move(y, x)
+        end = self.width if num < 0 else min(x + num, self.width)
+        self._styles[y][x:end] = [self.style(attr)] * (end - x)
+        self._dirty_rows.add(y)
+
+    def addstr(self, y: int, x: int, text: str, attr=None) -> None:
+        self.move(y, x)
+        style = DEFAULT_STYLE if attr is None else self.style(attr)
+        for char in text:
+            if char == "\n":
+                x = self.width  # continue on the next line
+            else:
+                self._chars[y][x] = char
+                self._styles[y][x] = style
+                self._dirty_rows.add(y)
+                x += 1
+            if x >= self.width:
+                y, x = y + 1, 0
+                if y >= self.height:
+                    y, x = self.height - 1, self.width - 1
+                    break
+        self.cursor_y, self.cursor_x = y, x
+
+    def insch(self, y: int, x: int, char: str, attr=None) -> None:
+        self.move(y, x)
+        style = DEFAULT_STYLE if attr is None else self.style(attr)
+        chars, styles = self._chars[y], self._styles[y]
+        chars.insert(x, char)
+        styles.insert(x, style)
+        del chars[-1], styles[-1]
+        self._dirty_rows.add(y)
+
+    def delch(self, y: int, x: int) -> None:
+        self.move(y, x)
+        chars, styles = self._chars[y], self._styles[y]
+        del chars[x], styles[x]
+        chars.append(" ")
+        styles.append(DEFAULT_STYLE)
+        self._dirty_rows.add(y)
+
+    def erase(self) -> None:
+        for y in range(self.height):
+            self._chars[y] = [" "] * self.width
+            self._styles[y] = [DEFAULT_STYLE] * self.width
+        self._dirty_rows = set(range(self.height))
+
+    def clear(self) -> None:
+        self.erase()
+        self._clear_terminal = True
+
+    def init_pair(self, pair: int, foreground: Color, background: Color) -> None:
+        self._pairs[pair] = (foreground, background)
+
+    def curs_set(self, visibility: int) -> None:
+        self.cursor_visible = bool(visibility)
+
+    def refresh(self) -> None:
+        frame = self.output.buffer
+        pieces = []
+        if self._clear_terminal:
+            pieces.append(f"{CSI}0m{CSI}2J")
+            self._front_chars = [[" "] * self.width for _ in range(self.height)]
+            self._front_styles = [[DEFAULT_STYLE] * self.width for _ in range(self.height)]
+            self._clear_terminal = False
+
+        cursor = None  # unknown until the first explicit move
+        current_style = DEFAULT_STYLE
+        sgr = sgr_transition
+        last_col = self.width - 1
+        for y in sorted(self._dirty_rows):
+            chars, styles = self._chars[y], self._styles[y]
+            front_chars, front_styles = self._front_chars[y], self._front_styles[y]
+            if chars == front_chars and styles == front_styles:
+                continue
+
+            for x in range(self.width):
+                char, style = chars[x], styles[x]
+                if char == front_chars[x] and style == front_styles[x]:
+                    continue
+
+                if cursor != (y, x):
+                    pieces.append(self._cursor_move(cursor, y, x))
+                if style != current_style:
+                    pieces.append(sgr(current_style, style))
+                    current_style = style
+                pieces.append(char)
+
+                # The cursor position after writing to the last column
+                # depends on the terminal's autowrap, so don't rely on it
+                cursor = (y, x + 1) if x < last_col else None
+
+            self._front_chars[y] = chars.copy()
+            self._front_styles[y] = styles.copy()
+        self._dirty_rows.clear()
+
+        if not pieces:
+            return
+        if current_style != DEFAULT_STYLE:
+            pieces.append(f"{CSI}0m")
+        if self.cursor_visible:
+            pieces.append(self._cursor_move(cursor, self.cursor_y, self.cursor_x))
+        frame += "".join(pieces).encode()
+        self.output.flush()
+
+    # Helpers
+
+    def style(self, attr) -> Style:
+        return parse_attr(attr, self._pairs)
+
+    @staticmethod
+    def _cursor_move(cursor: tuple[int, int] | None, y: int, x: int) -> str:
+        if cursor is not None:
+            cursor_y, cursor_x = cursor
+            if cursor_y == y and cursor_x < x:
+                gap = x - cursor_x
+                return f"{CSI}C" if gap == 1 else f"{CSI}{gap}C"
+            if cursor_y + 1 == y and x == 0:
+                return "\r\n"
+        if x == 0:
+            return f"{CSI}{y + 1}H"
+        return f"{CSI}{y + 1};{x + 1}H"
+
+    def _check_position(self, y: int, x: int) -> None:
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error(f"position {y, x} is outside of the screen")
+
+
+if __name__ == "__main__":
+    from shutil import get_terminal_size
+
+    from ConsoleGraphicsEngine import SPRITE, VirtualCanvas
+
+    columns, lines = get_terminal_size()
+    screen = AnsiScreen(lines - 1, columns)
+    screen.output.use_alternate_screen()
+    canvas = VirtualCanvas(screen)
+    for radius in range(1, min(lines, columns // 2) // 2):
+        color = (255 - radius * 10 % 256, radius * 20 % 256, 128)
+        canvas.draw_circle(columns // 4, lines // 2, radius, color)
+    canvas.add_sprite(2, 2, SPRITE)
+    canvas.safe_print(-1, 0, "Press enter to exit")
+    screen.refresh()
+    input()
+    screen.output.use_alternate_screen(False)
+    screen.output.flush()
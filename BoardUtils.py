@@ -156,3 +156,68 @@ class AlphanumericGrid:
 
             numerical_equivalent += (26 ** i) * (ord(char) - ord('A'))
         return numerical_equivalent
+
+
+class Bitboard:
+    """
+    Occupancy of a width x height grid as the bits of one integer: cell
+    (column, row) is bit row * width + column. Masks of any set of cells
+    combine with bitwise operators, so collision checks and free-space
+    queries are a few integer operations whatever the number of cars.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        row = (1 << width) - 1
+        first_column = sum(1 << (r * width) for r in range(height))
+        # columns_from[c]: every cell in column c or to the right of it
+        self._columns_from = [
+            first_column * ((row >> c) << c) & self.full for c in range(width + 1)
+        ]
+
+    def contains(self, cells: Range) -> bool:
+        return (0 <= cells.start.column and cells.end.column < self.width and
+                0 <= cells.start.row and cells.end.row < self.height)
+
+    def bit(self, location: Location) -> int:
+        return 1 << (location.row * self.width + location.column)
+
+    def mask(self, cells: Range) -> int:
+        """
+        Mask of every cell in the range
+        """
+        if not self.contains(cells):
+            raise ValueError(f"{cells} is outside of the {self.width}x{self.height} board")
+        row = ((1 << (cells.width + 1)) - 1) << cells.start.column
+        mask = 0
+        for r in range(cells.start.row, cells.end.row + 1):
+            mask |= row << (r * self.width)
+        return mask
+
+    def shift(self, mask: int, columns: int = 0, rows: int = 0) -> int:
+        """
+        Move every cell of the mask; cells pushed off the board are dropped
+        """
+        if columns > 0:
+            mask = (mask & ~self._columns_from[max(self.width - columns, 0)]) << columns
+        elif columns < 0:
+            mask = (mask & self._columns_from[min(-columns, self.width)]) >> -columns
+        if rows > 0:
+            mask <<= rows * self.width
+        elif rows < 0:
+            mask >>= -rows * self.width
+        return mask & self.full
+
+    def free(self, occupied: int) -> int:
+        return self.full & ~occupied
+
+    def locations(self, mask: int) -> list[Location]:
+        locations = []
+        while mask:
+            low_bit = mask & -mask
+            row, column = divmod(low_bit.bit_length() - 1, self.width)
+            locations.append(Location(column, row))
+            mask ^= low_bit
+        return locations
@@ -1,6 +1,9 @@
 import curses
 from enum import IntEnum, StrEnum
 
+import numpy as np
+
+from ConsoleInput import EventCoalescer
 from PngCodec import PngDecoder
 from utils.integer import bound, stable_round
 from utils.string import (
@@ -43,7 +46,8 @@ class EscCode(StrEnum):
     FN_CMD_DELETE = "3;9~"
 
 
-SPRITE = PngDecoder("car.png")
+SPRITE = PngDecoder("car.png", verbose=False)
+MOUSE_MASK = curses.ALL_MOUSE_EVENTS | curses.REPORT_MOUSE_POSITION
 
 
 def main(win: curses.window):
@@ -52,24 +56,32 @@ def main(win: curses.window):
     win.nodelay(True)
     curses.curs_set(0)  # hide the cursor
     curses.use_default_colors()
-    curses.mousemask(curses.ALL_MOUSE_EVENTS)
+    curses.mousemask(MOUSE_MASK)
 
     for color_i in range(1, curses.COLORS):
         curses.init_pair(color_i, color_i, color_i)
 
     color_i = 0
     j = 0
+    x = y = button = 0
     canvas = VirtualCanvas(win)
+    coalescer = EventCoalescer(is_mouse_motion)
     while True:
-        ch = win.getch()
-        if ch == ord('q'):
-            return 0
-        if ch == ord('f'):
-            j = 0
-        if ch == ord('d'):
-            DEBUG = not DEBUG
+        # Handle everything that arrived since the last frame, with runs of
+        # mouse motion collapsed into the latest position
+        for event in coalescer.coalesce(read_pending_events(win)):
+            match event:
+                case int(ch):
+                    if ch == ord('q'):
+                        return 0
+                    if ch == ord('f'):
+                        j = 0
+                    if ch == ord('d'):
+                        DEBUG = not DEBUG
+                    continue
+                case (_, x, y, _, button):
+                    pass
 
-        if ch == curses.KEY_MOUSE:
             win.clear()
             max_y, max_x = win.getmaxyx()
 
@@ -80,7 +92,8 @@ def main(win: curses.window):
                     f"Max X, Y: {tuple(reversed(win.getmaxyx()))}",
                     f"Has Colors: {curses.has_colors()}",
                     f"Num Colors: {curses.COLORS}",
-                    f"Can Change Color: {curses.can_change_color()}"
+                    f"Can Change Color: {curses.can_change_color()}",
+                    f"Coalesced: {coalescer.coalesced}/{coalescer.received}",
                 ]
                 for row, info in enumerate(debug_info, -len(debug_info)):
                     canvas.safe_print(row, 0, info)
@@ -92,7 +105,6 @@ def main(win: curses.window):
                     canvas.safe_print(grid_y+i, grid_x, str(i))
                 color_i = 1
 
-            _, x, y, _, button = curses.getmouse()
             canvas_x, canvas_y = canvas.virtualize(x, y)
             if button & curses.BUTTON1_RELEASED:
                 pass
@@ -118,7 +130,33 @@ def main(win: curses.window):
             elif button & curses.REPORT_MOUSE_POSITION:
                 canvas.draw_box(canvas_x, canvas_y, 3, 3, curses.color_pair(color_i))
                 color_i = (color_i + 1) % curses.COLORS
-            win.refresh()
+        win.refresh()
+
+
+def read_pending_events(win: curses.window) -> list[int | tuple]:
+    """
+    Drain the curses input queue without blocking. Keys are returned as
+    ints and mouse events as curses.getmouse() tuples.
+    """
+    events = []
+    while (ch := win.getch()) != -1:
+        if ch == curses.KEY_MOUSE:
+            try:
+                events.append(curses.getmouse())
+            except curses.error:
+                pass  # the mouse event was discarded by curses
+        else:
+            events.append(ch)
+    return events
+
+
+def is_mouse_motion(event: int | tuple) -> bool:
+    if type(event) != tuple:
+        return False
+    _, _, _, _, button = event
+    button_bits = button & curses.ALL_MOUSE_EVENTS & ~curses.REPORT_MOUSE_POSITION
+    button_bits &= ~(curses.BUTTON_SHIFT | curses.BUTTON_CTRL | curses.BUTTON_ALT)
+    return bool(button & curses.REPORT_MOUSE_POSITION) and not button_bits
 
 
 class VirtualCanvas:
@@ -155,20 +193,36 @@ class VirtualCanvas:
                         self.safe_print(self.p, 120, f"{actual_x, actual_x}")
                         self.p += 1
 
-    def add_sprite(self, x, y, sprite: PngDecoder):
-        color_palette = set(sprite.pixels.values())
+    def add_sprite(self, x, y, sprite: PngDecoder | np.ndarray):
+        """
+        Draw a decoded PNG, or any (height, width, 4) RGBA array, with its
+        top left corner at virtual (x, y). Fully transparent pixels are skipped.
+        """
+        image = getattr(sprite, "image", sprite)
+        rows, cols = (image[..., 3] != 0).nonzero()
+        attrs = self.color_attrs(image[rows, cols, :3])
+        for row, col, attr in zip(rows.tolist(), cols.tolist(), attrs):
+            self.color_virtual_pixel(x + col, y + row, attr)
+
+    def color_attrs(self, colors: np.ndarray) -> list:
+        """
+        Attribute to draw each (r, g, b) row of colors with
+        """
+        if getattr(self.screen, "truecolor", False):
+            # 24-bit screens take the colors as is, no palette slots needed
+            return list(map(tuple, colors.tolist()))
+
+        color_palette = np.unique(colors, axis=0).tolist()
         def c(v): return round((v / 255) * 1000)
 
         for i, color in enumerate(color_palette):
-            r, g, b, a = color
+            r, g, b = color
             curses.init_color(20 + i, c(r), c(g), c(b))
 
-        colors = {curses.color_content(color_code): color_code
-                  for color_code in range(curses.COLORS)}
-        for row, col in sprite.pixels:
-            r, g, b, a = sprite.pixels[row, col]
-            color_code = colors[c(r), c(g), c(b)]
-            self.color_virtual_pixel(x + col, y + row, curses.color_pair(color_code))
+        color_codes = {curses.color_content(color_code): color_code
+                       for color_code in range(curses.COLORS)}
+        return [curses.color_pair(color_codes[c(r), c(g), c(b)])
+                for r, g, b in colors.tolist()]
 
     def safe_print(self, row: int, col: int, str: str, color=None):
         if row < 0:
@@ -271,7 +325,7 @@ class VirtualCanvas:
                     unrecognized.append(unknown)
 
         # Restore normal mode
-        curses.mousemask(curses.ALL_MOUSE_EVENTS)
+        curses.mousemask(MOUSE_MASK)
         curses.curs_set(0)
         curses.flushinp()
 
@@ -390,5 +444,81 @@ class VirtualCanvas:
                 self.color_virtual_pixel(-y + center_x, -x + center_y, color)
 
 
+class SpritePlayer:
+    """
+    Plays a sequence of RGBA frames (an ApngAnimation, SpriteAtlas.sequence
+    or any list of arrays) at virtual (x, y) on a canvas. Each frame only
+    repaints the pixels that differ from the frame on screen; pixels that
+    became transparent are painted with the background attribute.
+    """
+
+    DEFAULT_DELAY = 0.1  # seconds per frame when the frames don't say
+
+    def __init__(self, canvas: VirtualCanvas, frames, x, y,
+                 delays: list[float] = None, background=0) -> None:
+        self.canvas = canvas
+        self.frames = frames
+        self.x = x
+        self.y = y
+        self.delays = delays or getattr(frames, "delays", None) or \
+            [self.DEFAULT_DELAY] * len(frames)
+        self.background = background
+        self.index = -1
+        self._shown = None  # frame currently on screen
+
+    def show(self, index: int) -> int:
+        """
+        Draw a frame and return the number of pixels that were repainted
+        """
+        frame = shown = self.frames[index]
+        if self._shown is None:
+            previous = np.zeros_like(frame)
+        else:
+            height = max(frame.shape[0], self._shown.shape[0])
+            width = max(frame.shape[1], self._shown.shape[1])
+            frame, previous = pad(frame, height, width), pad(self._shown, height, width)
+
+        visible, was_visible = frame[..., 3] != 0, previous[..., 3] != 0
+        changed = (visible != was_visible) | (visible & (frame != previous).any(axis=2))
+        rows, cols = changed.nonzero()
+        opaque = visible[rows, cols]
+
+        attrs = self.canvas.color_attrs(frame[rows[opaque], cols[opaque], :3])
+        for row, col, attr in zip(rows[opaque].tolist(), cols[opaque].tolist(), attrs):
+            self.canvas.color_virtual_pixel(self.x + col, self.y + row, attr)
+        for row, col in zip(rows[~opaque].tolist(), cols[~opaque].tolist()):
+            self.canvas.color_virtual_pixel(self.x + col, self.y + row, self.background)
+
+        self._shown = shown
+        self.index = index
+        return len(rows)
+
+    def advance(self) -> float:
+        """
+        Show the next frame, looping around, and return how long it should
+        stay on screen
+        """
+        self.show((self.index + 1) % len(self.frames))
+        return self.delays[self.index]
+
+    def play(self, loops: int = 1) -> None:
+        from time import sleep
+        for _ in range(loops * len(self.frames)):
+            delay = self.advance()
+            self.canvas.screen.refresh()
+            sleep(delay)
+
+
+def pad(frame: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    Extend a frame with transparent pixels to height x width
+    """
+    if frame.shape[:2] == (height, width):
+        return frame
+    padded = np.zeros((height, width, 4), dtype=frame.dtype)
+    padded[:frame.shape[0], :frame.shape[1]] = frame
+    return padded
+
+
 if __name__ == "__main__":
     curses.wrapper(main)
@@ -1,11 +1,17 @@
-from enum import Enum
-from os import system, read
+from codecs import getincrementaldecoder
+from dataclasses import dataclass
+from enum import Enum, IntEnum, IntFlag
+from os import read
+from select import select
 
 import atexit
+import re
 import sys
 import tty
 import termios
 
+from ConsoleOutput import ConsoleOutput
+
 
 class MouseCode(Enum):
     PRESS = 9
@@ -18,12 +24,382 @@ class MouseCode(Enum):
     AS_DECIMAL_ALT = 1015
 
 
+class SpecialKey(Enum):
+    ESC = "esc"
+    ENTER = "enter"
+    TAB = "tab"
+    BACKSPACE = "backspace"
+    UP = "up"
+    DOWN = "down"
+    RIGHT = "right"
+    LEFT = "left"
+    HOME = "home"
+    END = "end"
+    INSERT = "insert"
+    DELETE = "delete"
+    PAGE_UP = "page_up"
+    PAGE_DOWN = "page_down"
+    F1 = "f1"
+    F2 = "f2"
+    F3 = "f3"
+    F4 = "f4"
+    F5 = "f5"
+    F6 = "f6"
+    F7 = "f7"
+    F8 = "f8"
+    F9 = "f9"
+    F10 = "f10"
+    F11 = "f11"
+    F12 = "f12"
+
+
+class Modifier(IntFlag):
+    NONE = 0
+    SHIFT = 1
+    ALT = 2
+    CTRL = 4
+    META = 8
+
+
+class MouseButton(IntEnum):
+    LEFT = 0
+    MIDDLE = 1
+    RIGHT = 2
+    NONE = 3
+    WHEEL_UP = 64
+    WHEEL_DOWN = 65
+
+
+class MouseAction(Enum):
+    PRESS = "press"
+    RELEASE = "release"
+    MOTION = "motion"
+
+
+@dataclass(frozen=True)
+class KeyEvent:
+    key: str | SpecialKey
+    modifiers: Modifier = Modifier.NONE
+
+
+@dataclass(frozen=True)
+class MouseEvent:
+    x: int
+    y: int
+    button: MouseButton
+    action: MouseAction
+    modifiers: Modifier = Modifier.NONE
+
+    @property
+    def is_motion(self) -> bool:
+        return self.action is MouseAction.MOTION
+
+
+class RingBuffer:
+    """
+    FIFO queue over a fixed list of slots. The capacity doubles when the
+    buffer fills up so that no event is ever dropped.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._slots = [None] * capacity
+        self._head = 0  # index of the oldest item
+        self._size = 0
+
+    def push(self, item) -> None:
+        capacity = len(self._slots)
+        if self._size == capacity:
+            self._slots = list(self) + [None] * capacity
+            self._head = 0
+            capacity *= 2
+        self._slots[(self._head + self._size) % capacity] = item
+        self._size += 1
+
+    def pop(self):
+        if self._size == 0:
+            raise IndexError("pop from an empty ring buffer")
+        item = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % len(self._slots)
+        self._size -= 1
+        return item
+
+    def drain(self) -> list:
+        items = list(self)
+        self._slots = [None] * len(self._slots)
+        self._head = 0
+        self._size = 0
+        return items
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        capacity = len(self._slots)
+        for i in range(self._size):
+            yield self._slots[(self._head + i) % capacity]
+
+
+class EventCoalescer:
+    """
+    Sits between an input source and its handlers. Runs of consecutive
+    motion events are merged into the most recent one so a frame only ever
+    handles the latest pointer position, while every other event (presses,
+    releases, keys) is passed through in order.
+    """
+
+    def __init__(self, is_motion=lambda event: getattr(event, 'is_motion', False)) -> None:
+        self.is_motion = is_motion
+        self.received = 0  # events passed in
+        self.coalesced = 0  # motion events merged away
+
+    def coalesce(self, events) -> list:
+        merged = []
+        previous_is_motion = False
+        for event in events:
+            self.received += 1
+            is_motion = self.is_motion(event)
+            if is_motion and previous_is_motion:
+                merged[-1] = event
+                self.coalesced += 1
+            else:
+                merged.append(event)
+            previous_is_motion = is_motion
+        return merged
+
+
+class InputParser:
+    """
+    Incremental parser for the bytes a terminal sends in raw mode. Bytes are
+    fed in whatever chunks os.read returns them and the parser keeps its
+    state between calls, so sequences split across reads are still decoded.
+    """
+
+    # Parser states
+    GROUND = 0
+    ESCAPE = 1
+    CSI = 2
+    SS3 = 3
+
+    ESC = 0x1b
+
+    # Whole SGR mouse reports (e.g. \e[<35;10;4M) are matched in one step so
+    # that motion floods are not walked through the state machine bytewise
+    SGR_MOUSE = re.compile(rb"\x1b\[<(\d+);(\d+);(\d+)([Mm])")
+    TEXT_RUN = re.compile(rb"[\x20-\x7e\x80-\xff]+")
+
+    CSI_FINAL_KEYS = {
+        ord('A'): SpecialKey.UP,
+        ord('B'): SpecialKey.DOWN,
+        ord('C'): SpecialKey.RIGHT,
+        ord('D'): SpecialKey.LEFT,
+        ord('H'): SpecialKey.HOME,
+        ord('F'): SpecialKey.END,
+        ord('P'): SpecialKey.F1,
+        ord('Q'): SpecialKey.F2,
+        ord('R'): SpecialKey.F3,
+        ord('S'): SpecialKey.F4,
+    }
+    CSI_TILDE_KEYS = {
+        1: SpecialKey.HOME,
+        2: SpecialKey.INSERT,
+        3: SpecialKey.DELETE,
+        4: SpecialKey.END,
+        5: SpecialKey.PAGE_UP,
+        6: SpecialKey.PAGE_DOWN,
+        7: SpecialKey.HOME,
+        8: SpecialKey.END,
+        11: SpecialKey.F1,
+        12: SpecialKey.F2,
+        13: SpecialKey.F3,
+        14: SpecialKey.F4,
+        15: SpecialKey.F5,
+        17: SpecialKey.F6,
+        18: SpecialKey.F7,
+        19: SpecialKey.F8,
+        20: SpecialKey.F9,
+        21: SpecialKey.F10,
+        23: SpecialKey.F11,
+        24: SpecialKey.F12,
+    }
+    CONTROL_KEYS = {
+        0x09: SpecialKey.TAB,
+        0x0a: SpecialKey.ENTER,
+        0x0d: SpecialKey.ENTER,
+        0x7f: SpecialKey.BACKSPACE,
+        0x08: SpecialKey.BACKSPACE,
+    }
+
+    def __init__(self, events: RingBuffer = None) -> None:
+        self.events = events if events is not None else RingBuffer()
+        self.state = self.GROUND
+        self._sequence = bytearray()  # parameter/intermediate bytes read so far
+        self._text_decoder = getincrementaldecoder('utf-8')(errors='replace')
+
+    @property
+    def pending(self) -> bool:
+        """
+        Whether a partially read escape sequence is waiting for more bytes
+        """
+        return self.state != self.GROUND
+
+    def feed(self, data: bytes) -> None:
+        i = 0
+        end = len(data)
+        while i < end:
+            if self.state == self.GROUND:
+                byte = data[i]
+                if byte == self.ESC:
+                    if (match := self.SGR_MOUSE.match(data, i)):
+                        self._emit_mouse(*match.groups())
+                        i = match.end()
+                    else:
+                        self.state = self.ESCAPE
+                        i += 1
+                elif (match := self.TEXT_RUN.match(data, i)):
+                    for char in self._text_decoder.decode(match.group()):
+                        self.events.push(KeyEvent(char))
+                    i = match.end()
+                else:
+                    self._emit_control(byte)
+                    i += 1
+            elif self.state == self.ESCAPE:
+                i = self._parse_escape(data, i)
+            else:
+                i = self._parse_sequence(data, i)
+
+    def flush(self) -> None:
+        """
+        Resolve a dangling sequence once no more input is coming, e.g. a
+        lone ESC keypress or an Alt chord that was interrupted
+        """
+        match self.state:
+            case self.ESCAPE:
+                self.events.push(KeyEvent(SpecialKey.ESC))
+            case self.CSI:
+                self.events.push(KeyEvent('[', Modifier.ALT))
+            case self.SS3:
+                self.events.push(KeyEvent('O', Modifier.ALT))
+        self._reset()
+
+    def _parse_escape(self, data: bytes, i: int) -> int:
+        byte = data[i]
+        match byte:
+            case 0x5b:  # [
+                self.state = self.CSI
+            case 0x4f:  # O
+                self.state = self.SS3
+            case self.ESC:
+                # A second ESC resolves the first one as a keypress
+                self.events.push(KeyEvent(SpecialKey.ESC))
+            case _:
+                self._reset()
+                if byte in self.CONTROL_KEYS:
+                    self.events.push(KeyEvent(self.CONTROL_KEYS[byte], Modifier.ALT))
+                else:
+                    self.events.push(KeyEvent(chr(byte), Modifier.ALT))
+        return i + 1
+
+    def _parse_sequence(self, data: bytes, i: int) -> int:
+        end = len(data)
+        sequence = self._sequence
+        while i < end:
+            byte = data[i]
+            i += 1
+            if 0x20 <= byte <= 0x3f and self.state == self.CSI:
+                sequence.append(byte)  # parameter or intermediate byte
+            elif 0x40 <= byte <= 0x7e:
+                if self.state == self.CSI:
+                    self._emit_csi(bytes(sequence), byte)
+                else:
+                    self._emit_ss3(byte)
+                self._reset()
+                break
+            else:
+                # Malformed sequence, drop it and reparse the byte
+                self._reset()
+                i -= 1
+                break
+        return i
+
+    def _emit_csi(self, params: bytes, final: int) -> None:
+        if params.startswith(b'<') and final in b'Mm':
+            fields = params[1:].split(b';')
+            if len(fields) == 3:
+                self._emit_mouse(*fields, bytes((final,)))
+            return
+
+        numbers = [int(p) if p.isdigit() else 0 for p in params.split(b';')] if params else []
+        modifiers = self._parse_modifiers(numbers[1] if len(numbers) > 1 else 1)
+        if final == ord('~'):
+            key = self.CSI_TILDE_KEYS.get(numbers[0] if numbers else 0)
+        elif final == ord('Z'):
+            key, modifiers = SpecialKey.TAB, modifiers | Modifier.SHIFT
+        else:
+            key = self.CSI_FINAL_KEYS.get(final)
+
+        if key is not None:
+            self.events.push(KeyEvent(key, modifiers))
+
+    def _emit_ss3(self, final: int) -> None:
+        if (key := self.CSI_FINAL_KEYS.get(final)) is not None:
+            self.events.push(KeyEvent(key))
+
+    def _emit_mouse(self, code: bytes, x: bytes, y: bytes, final: bytes) -> None:
+        code = int(code)
+        modifiers = Modifier.NONE
+        if code & 4:
+            modifiers |= Modifier.SHIFT
+        if code & 8:
+            modifiers |= Modifier.ALT
+        if code & 16:
+            modifiers |= Modifier.CTRL
+
+        if code & 64:
+            button = MouseButton.WHEEL_UP if code & 1 == 0 else MouseButton.WHEEL_DOWN
+        else:
+            button = MouseButton(code & 3)
+
+        if code & 32:
+            action = MouseAction.MOTION
+        elif final == b'm':
+            action = MouseAction.RELEASE
+        else:
+            action = MouseAction.PRESS
+
+        # Reports are one-based, screen coordinates are zero-based
+        self.events.push(MouseEvent(int(x) - 1, int(y) - 1, button, action, modifiers))
+
+    def _emit_control(self, byte: int) -> None:
+        if byte in self.CONTROL_KEYS:
+            self.events.push(KeyEvent(self.CONTROL_KEYS[byte]))
+        elif 0x01 <= byte <= 0x1a:
+            self.events.push(KeyEvent(chr(byte + 0x60), Modifier.CTRL))
+        # Any other control bytes (NUL, FS, GS, ...) are ignored
+
+    @staticmethod
+    def _parse_modifiers(param: int) -> Modifier:
+        # xterm encodes modifiers as 1 + (shift | alt << 1 | ctrl << 2 | meta << 3)
+        return Modifier(max(param - 1, 0) & 0xf)
+
+    def _reset(self) -> None:
+        self.state = self.GROUND
+        self._sequence.clear()
+
+
 class ConsoleInput:
-    def __init__(self) -> None:
-        pass
+    READ_SIZE = 4096  # bytes requested from the terminal per read
+    ESC_TIMEOUT = 0.025  # seconds to wait for the rest of an escape sequence
+
+    def __init__(self, fd: int = None, output: ConsoleOutput = None) -> None:
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.output = ConsoleOutput() if output is None else output
+        self.events = RingBuffer()
+        self.parser = InputParser(self.events)
+        self._mouse_codes = []  # reporting modes currently enabled
 
     def enable_raw_mode(self):
-        fd = sys.stdin.fileno()
+        fd = self.fd
 
         # Save terminal mode to restore at program exit
         old = termios.tcgetattr(fd)
@@ -31,31 +407,61 @@ class ConsoleInput:
 
         tty.setraw(fd)
 
-    # Mouse Reporting
+    def read_events(self, timeout: float = None) -> list[KeyEvent | MouseEvent]:
+        """
+        Wait up to timeout seconds (forever if None) for input, then parse
+        everything that is available and return the decoded events
+        """
+        if select([self.fd], [], [], timeout)[0]:
+            self._read_available()
 
-    def enable_mouse(self, code: MouseCode):
-        self._use_mouse_code(code)
-        atexit.register(self.disable_mouse_reporting)
+        # Give a partial escape sequence a moment to complete
+        if self.parser.pending:
+            if select([self.fd], [], [], self.ESC_TIMEOUT)[0]:
+                self._read_available()
+            if self.parser.pending:
+                self.parser.flush()
 
-    def disable_mouse_reporting(self, code=MouseCode.ALL):
-        self._use_mouse_code(code, disable=True)
+        return self.events.drain()
 
-    def _use_mouse_code(self, code: MouseCode, disable=False):
-        command = f"printf '\e[?{code.value}'"
-        command += 'l' if disable else 'h'
-        system(command)
+    def _read_available(self) -> None:
+        while True:
+            data = read(self.fd, self.READ_SIZE)
+            self.parser.feed(data)
+            if len(data) < self.READ_SIZE or not select([self.fd], [], [], 0)[0]:
+                break
+
+    # Mouse Reporting
+
+    def enable_mouse(self, *codes: MouseCode):
+        """
+        Enable one or more mouse reporting modes with a single write
+        """
+        if not self._mouse_codes:
+            atexit.register(self.disable_mouse_reporting)
+        for code in codes:
+            self.output.set_mode(code.value)
+            self._mouse_codes.append(code)
+        self.output.flush()
+
+    def disable_mouse_reporting(self, *codes: MouseCode):
+        """
+        Disable the given reporting modes, or every enabled mode if none are
+        given, with a single write
+        """
+        for code in codes or reversed(self._mouse_codes):
+            self.output.set_mode(code.value, enabled=False)
+        self._mouse_codes = [c for c in self._mouse_codes if codes and c not in codes]
+        self.output.flush()
 
 
 if __name__ == '__main__':
     ci = ConsoleInput()
     ci.enable_raw_mode()
-    ci.enable_mouse(MouseCode.ALL)
-    ci.enable_mouse(MouseCode.AS_DECIMAL)
-    from datetime import datetime, timedelta
-    start = datetime.now()
-    input = ""
-    while datetime.now() - start < timedelta(seconds=1):
-        input += sys.stdin.read(1)
-    sys.stdin.flush()
-    print(input.encode())
-
+    ci.enable_mouse(MouseCode.ALL, MouseCode.AS_DECIMAL)
+    print("Press q to quit", end='\r\n')
+    while True:
+        for event in ci.read_events():
+            print(event, end='\r\n')
+            if event == KeyEvent('q') or event == KeyEvent('c', Modifier.CTRL):
+                exit()
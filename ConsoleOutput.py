@@ -0,0 +1,105 @@
+from os import write
+
+import sys
+
+ESC = "\x1b"
+CSI = ESC + "["
+
+RGB = tuple[int, int, int]
+
+
+class ConsoleOutput:
+    """
+    Terminal output layer. Text and escape sequences are collected in an
+    in-process buffer and sent to the terminal with a single os.write per
+    flush, so a frame's worth of mode changes and cursor/color commands
+    costs one syscall instead of one process or write each.
+    """
+
+    def __init__(self, fd: int = None) -> None:
+        self.fd = sys.stdout.fileno() if fd is None else fd
+        self.buffer = bytearray()
+
+    def write(self, data: str | bytes) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        self.buffer += data
+
+    def flush(self) -> None:
+        with memoryview(self.buffer) as view:
+            # os.write may accept only part of the buffer when the tty is busy
+            written = 0
+            while written < len(view):
+                written += write(self.fd, view[written:])
+        self.buffer.clear()
+
+    # Terminal modes
+
+    def set_mode(self, code: int, enabled: bool = True) -> None:
+        self.write(f"{CSI}?{code}{'h' if enabled else 'l'}")
+
+    def show_cursor(self, visible: bool = True) -> None:
+        self.set_mode(25, visible)
+
+    def use_alternate_screen(self, enabled: bool = True) -> None:
+        self.set_mode(1049, enabled)
+
+    # Cursor
+
+    def move_cursor(self, row: int, col: int) -> None:
+        # Escape sequences are one-based, screen coordinates are zero-based
+        self.write(f"{CSI}{row + 1};{col + 1}H")
+
+    def clear_screen(self) -> None:
+        self.write(f"{CSI}2J")
+
+    # Colors and attributes
+
+    def sgr(self, *params: int) -> None:
+        """
+        Select Graphic Rendition, e.g. sgr(1, 31) for bold red text
+        """
+        self.write(f"{CSI}{';'.join(map(str, params))}m")
+
+    def set_foreground(self, color: int | RGB) -> None:
+        self.sgr(*color_params(color, background=False))
+
+    def set_background(self, color: int | RGB) -> None:
+        self.sgr(*color_params(color, background=True))
+
+    def reset_attributes(self) -> None:
+        self.sgr(0)
+
+
+def color_params(color: int | RGB, background: bool = False) -> tuple[int, ...]:
+    """
+    SGR parameters for a 256-color palette index or a 24-bit (r, g, b) color
+    """
+    base = 48 if background else 38
+    if isinstance(color, tuple):
+        r, g, b = color
+        return (base, 2, r, g, b)
+    return (base, 5, color)
+
+
+XTERM_BASE_COLORS = (
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+)
+XTERM_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+
+def palette_rgb(index: int) -> RGB:
+    """
+    The (r, g, b) color xterm uses for a 256-color palette index
+    """
+    if index < 16:
+        return XTERM_BASE_COLORS[index]
+    if index < 232:
+        r, rest = divmod(index - 16, 36)
+        g, b = divmod(rest, 6)
+        return XTERM_CUBE_LEVELS[r], XTERM_CUBE_LEVELS[g], XTERM_CUBE_LEVELS[b]
+    grey = 8 + 10 * (index - 232)
+    return grey, grey, grey
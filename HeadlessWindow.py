@@ -0,0 +1,179 @@
+import curses
+
+import numpy as np
+
+from AnsiScreen import DEFAULT_STYLE, Style, parse_attr, sgr_transition
+from ConsoleOutput import CSI, RGB, palette_rgb
+from PngCodec import PngEncoder
+
+
+class HeadlessWindow:
+    """
+    In-memory terminal with the surface VirtualCanvas uses from
+    curses.window, for rendering without a TTY (tests, batch jobs, worker
+    processes, benchmarks). Cells live in NumPy arrays:
+      - chars: the character in each cell
+      - foreground, background: 24-bit colors per cell
+      - has_foreground, has_background: False where the terminal default
+        color is used
+
+    Frames can be dumped as text, ANSI escape sequences or an RGBA image.
+    """
+
+    truecolor = True
+
+    # Colors used for terminal defaults when rasterizing
+    DEFAULT_FOREGROUND: RGB = (229, 229, 229)
+    DEFAULT_BACKGROUND: RGB = (0, 0, 0)
+
+    def __init__(self, height: int, width: int) -> None:
+        self.height = height
+        self.width = width
+        self.chars = np.full((height, width), " ", dtype="<U1")
+        self.foreground = np.zeros((height, width, 3), dtype=np.uint8)
+        self.background = np.zeros((height, width, 3), dtype=np.uint8)
+        self.has_foreground = np.zeros((height, width), dtype=bool)
+        self.has_background = np.zeros((height, width), dtype=bool)
+        self.cursor_y = 0
+        self.cursor_x = 0
+        self.cursor_visible = False
+        self.refresh_count = 0
+        self._pairs: dict[int, Style] = {0: DEFAULT_STYLE}
+
+    # curses.window interface
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def getyx(self) -> tuple[int, int]:
+        return self.cursor_y, self.cursor_x
+
+    def move(self, y: int, x: int) -> None:
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error(f"position {y, x} is outside of the screen")
+        self.cursor_y, self.cursor_x = y, x
+
+    def chgat(self, y: int, x: int, num: int, attr) -> None:
+        self.move(y, x)
+        end = self.width if num < 0 else min(x + num, self.width)
+        self._set_style(np.s_[y, x:end], self._style(attr))
+
+    def addstr(self, y: int, x: int, text: str, attr=None) -> None:
+        self.move(y, x)
+        style = self._style(attr)
+        for line_i, line in enumerate(text.split("\n")):
+            if line_i > 0:
+                y, x = y + 1, 0
+            while line and y < self.height:
+                length = min(len(line), self.width - x)
+                self.chars[y, x:x + length] = list(line[:length])
+                self._set_style(np.s_[y, x:x + length], style)
+                line = line[length:]
+                x += length
+                if x == self.width:
+                    y, x = y + 1, 0
+            if y >= self.height:
+                y, x = self.height - 1, self.width - 1
+                break
+        self.cursor_y, self.cursor_x = y, x
+
+    def insch(self, y: int, x: int, char: str, attr=None) -> None:
+        self.move(y, x)
+        for layer in self._layers():
+            layer[y, x + 1:] = layer[y, x:-1].copy()
+        self.chars[y, x] = char
+        self._set_style(np.s_[y, x], self._style(attr))
+
+    def delch(self, y: int, x: int) -> None:
+        self.move(y, x)
+        for layer in self._layers():
+            layer[y, x:-1] = layer[y, x + 1:].copy()
+        self.chars[y, -1] = " "
+        self._set_style(np.s_[y, -1], DEFAULT_STYLE)
+
+    def erase(self) -> None:
+        self.chars[:] = " "
+        self.has_foreground[:] = False
+        self.has_background[:] = False
+
+    def clear(self) -> None:
+        self.erase()
+
+    def refresh(self) -> None:
+        self.refresh_count += 1
+
+    def init_pair(self, pair: int, foreground, background) -> None:
+        self._pairs[pair] = (foreground, background)
+
+    def curs_set(self, visibility: int) -> None:
+        self.cursor_visible = bool(visibility)
+
+    # Frame dumps
+
+    def to_text(self) -> str:
+        return "\n".join("".join(row) for row in self.chars)
+
+    def to_ansi(self) -> str:
+        pieces = []
+        current_style = DEFAULT_STYLE
+        for y in range(self.height):
+            if y > 0:
+                pieces.append("\n")
+            for x in range(self.width):
+                style = self.style_at(y, x)
+                if style != current_style:
+                    pieces.append(sgr_transition(current_style, style))
+                    current_style = style
+                pieces.append(self.chars[y, x])
+        if current_style != DEFAULT_STYLE:
+            pieces.append(f"{CSI}0m")
+        return "".join(pieces)
+
+    def to_image(self, cell_width: int = 1, cell_height: int = 1) -> np.ndarray:
+        """
+        Rasterize the frame as an RGBA array, one cell_height x cell_width
+        block per cell. A cell takes its background color, or its foreground
+        color when it holds a glyph on the default background.
+        """
+        image = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        image[..., 3] = 255
+        image[..., :3] = self.DEFAULT_BACKGROUND
+
+        glyphs = (self.chars != " ") & ~self.has_background
+        image[glyphs, :3] = self.DEFAULT_FOREGROUND
+        colored_glyphs = glyphs & self.has_foreground
+        image[colored_glyphs, :3] = self.foreground[colored_glyphs]
+        image[self.has_background, :3] = self.background[self.has_background]
+
+        return image.repeat(cell_height, axis=0).repeat(cell_width, axis=1)
+
+    def save_png(self, filename: str, cell_width: int = 1, cell_height: int = 1,
+                 level: int = 6) -> None:
+        PngEncoder(self.to_image(cell_width, cell_height), level=level).save(filename)
+
+    def style_at(self, y: int, x: int) -> Style:
+        foreground = tuple(self.foreground[y, x].tolist()) if self.has_foreground[y, x] else None
+        background = tuple(self.background[y, x].tolist()) if self.has_background[y, x] else None
+        return foreground, background
+
+    # Helpers
+
+    def _style(self, attr) -> Style:
+        return DEFAULT_STYLE if attr is None else parse_attr(attr, self._pairs)
+
+    def _set_style(self, cells, style: Style) -> None:
+        foreground, background = style
+        self.has_foreground[cells] = foreground is not None
+        self.has_background[cells] = background is not None
+        if foreground is not None:
+            self.foreground[cells] = self._rgb(foreground)
+        if background is not None:
+            self.background[cells] = self._rgb(background)
+
+    def _layers(self) -> tuple[np.ndarray, ...]:
+        return (self.chars, self.foreground, self.background,
+                self.has_foreground, self.has_background)
+
+    @staticmethod
+    def _rgb(color: int | RGB) -> RGB:
+        return color if isinstance(color, tuple) else palette_rgb(color)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+from PngCodec import PngDecoder
+
+DEFAULT_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "ConsoleGraphicsEngine", "images"
+)
+ENTRY_SUFFIX = ".npy"
+
+
+class ImageCache:
+    """
+    On-disk cache of decoded RGBA images, so warm starts skip inflating and
+    unfiltering entirely. Entries are keyed by the file's path, mtime, size
+    and content hash, stored as raw .npy arrays and memory-mapped back
+    read-only without copying. Once the cache grows past max_bytes the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 max_bytes: int = 256 * 1024 * 1024, check_crc=True) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.check_crc = check_crc
+        self.hits = 0
+        self.misses = 0
+        self._keys = {}  # (path, mtime, size) -> key, saves rehashing files
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, filename: str) -> np.ndarray:
+        entry = self._entry_path(self.key(filename))
+        try:
+            image = np.load(entry, mmap_mode="r")
+            os.utime(entry)  # mark as recently used
+            self.hits += 1
+            return image
+        except (FileNotFoundError, ValueError):
+            pass  # missing or truncated entry
+
+        self.misses += 1
+        image = PngDecoder(filename, self.check_crc, verbose=False).image
+        self._store(entry, image)
+        self.evict()
+        return image
+
+    def key(self, filename: str) -> str:
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        file_id = (path, stat.st_mtime_ns, stat.st_size)
+        if (key := self._keys.get(file_id)) is None:
+            digest = hashlib.blake2b(digest_size=20)
+            digest.update(f"{path}\0{stat.st_mtime_ns}\0{stat.st_size}\0".encode())
+            with open(path, "rb") as file:
+                digest.update(hashlib.file_digest(file, "blake2b").digest())
+            key = self._keys[file_id] = digest.hexdigest()
+        return key
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        total = 0
+        for dir_entry in os.scandir(self.directory):
+            if dir_entry.name.endswith(ENTRY_SUFFIX):
+                stat = dir_entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, dir_entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # evicted concurrently
+            total -= size
+
+    def clear(self) -> None:
+        for dir_entry in os.scandir(self.directory):
+            if dir_entry.name.endswith(ENTRY_SUFFIX):
+                os.remove(dir_entry.path)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _store(self, entry: str, image: np.ndarray) -> None:
+        # Write to a temporary file first so readers never see partial entries
+        with NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+            np.save(file, image)
+        os.replace(file.name, entry)
@@ -1,9 +1,18 @@
 import struct
+import zlib
 
-from collections import Counter, defaultdict
+from bisect import bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from enum import IntEnum
+from functools import cache
+from heapq import merge
 from io import SEEK_CUR, SEEK_SET, BufferedReader
-from typing import Sequence
+from itertools import accumulate
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Sequence
 
 INFGEN = False
 
@@ -32,79 +41,158 @@ class PngDecodeError(UnicodeDecodeError):
 
 
 class PngDecoder:
-    def __init__(self, filename, check_crc=True) -> None:
-
-        file = StrictBufferedReader(filename)
-        signature = file.read(len(Iso.SIGNATURE))
-        if signature != Iso.SIGNATURE:
-            raise PngDecodeError(file, 0, len(Iso.SIGNATURE), "invalid signature")
+    """
+    Decodes a PNG (or APNG) file into an RGBA array. With lazy=True only
+    the header and the chunks before the image data are read, so metadata
+    (size, color type, palette, text...) is available right away; the rest
+    of the file is read and decoded the first time image or animation is
+    accessed. verbose prints a line per chunk read.
+    """
 
-        if check_crc:
-            crc = Crc()
+    def __init__(self, filename, check_crc=True, lazy=False, verbose=True) -> None:
+        self.filename = filename
+        self.check_crc = check_crc
+        self.verbose = verbose
 
-        # Read chunks
         self.chunks_read = []
-        image_data = bytearray()
+        self.palette = None
+        self.alpha_samples = None
+        self.transparent_sample = None  # grey or RGB sample value keyed as transparent
+        self.text = {}  # tEXt keyword -> text
+        self.gamma = None
+        self.time_last_modified = None
+        self.num_frames = None  # APNG frame count, None for still images
+        self.num_plays = 0
+        self._chunk_order = ChunkOrderValidator()
+        self._image_data = bytearray()
+        self._frames = []  # APNG frame controls with their compressed data
+        self._default_image_is_frame = False
+        self._image = None
+        self._animation = None
+
+        with StrictBufferedReader(filename) as file:
+            signature = file.read(len(Iso.SIGNATURE))
+            if signature != Iso.SIGNATURE:
+                raise PngDecodeError(file, 0, len(Iso.SIGNATURE), "invalid signature")
+            self._resume_offset = self._read_chunks(file, stop_at_image_data=lazy)
+
+        if self.alpha_samples is None and self.color_type == 3:
+            self.alpha_samples = (255,) * len(self.palette)
+        if not lazy:
+            self._load()
+
+    @classmethod
+    def probe(cls, filename, check_crc=True):
+        """
+        Read only the metadata of a PNG file, quietly
+        """
+        return cls(filename, check_crc, lazy=True, verbose=False)
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._load()
+        return self._image
+
+    @property
+    def animation(self):
+        if self._image is None:
+            self._load()
+        return self._animation
+
+    def _load(self) -> None:
+        """
+        Read the rest of the file and decode the image (and animation)
+        """
+        if self._resume_offset is not None:
+            with StrictBufferedReader(self.filename) as file:
+                file.seek(self._resume_offset, SEEK_SET)
+                self._read_chunks(file, stop_at_image_data=False)
+            self._resume_offset = None
+
+        image = self._decode_image_data(self._image_data, self.width, self.height)
+        if self.num_frames is not None:
+            self._animation = ApngAnimation(self, self._frames, self.num_plays,
+                                            self._default_image_is_frame)
+            if len(self._animation) != self.num_frames:
+                raise ValueError(f"expected {self.num_frames} animation frames, "
+                                 f"found {len(self._animation)}")
+        self._image = image
+        self._image_data = None
+
+    def _read_chunks(self, file: BufferedReader, stop_at_image_data: bool) -> int | None:
+        """
+        Read chunks until the end of the file, or until the first IDAT chunk
+        if stop_at_image_data, returning its offset to resume from
+        """
+        crc = shared_crc() if self.check_crc else None
+        chunk_order = self._chunk_order
+        frames = self._frames
         while file.readable():
             chunk_start = file.tell()
             length = int.from_bytes(file.read(Iso.SUB_CHUNK_SIZE))
             name = file.read(Iso.SUB_CHUNK_SIZE).decode(Iso.CHUNK_NAME_ENCODING)
-            if not Iso.can_parse_chunk(name, self.chunks_read):
+            if stop_at_image_data and name == Iso.IMAGE_DATA:
+                return chunk_start
+            if not chunk_order.can_add(name):
                 if Iso.chunk_is_critical(name):
                     error_message = f"unrecognized critical chunk: {name}"
                     raise PngDecodeError(file, chunk_start, file.tell(), error_message)
                 else:
                     # Ignore unrecognized non-critical chunks
                     file.seek(length + Iso.SUB_CHUNK_SIZE, SEEK_CUR)
-                    if not INFGEN:
+                    if self.verbose and not INFGEN:
                         print(f"ignoring chunk {name}")
                     continue
 
             # Read chunk data
             data = file.read(length)
             crc_code = int.from_bytes(file.read(Iso.SUB_CHUNK_SIZE))
-            if check_crc and crc_code != crc.calculate(name.encode() + data):
+            if crc is not None and crc_code != crc.calculate(name.encode() + data):
                 error_message = f"chunk {name} failed CRC"
                 raise PngDecodeError(file, chunk_start, file.tell(), error_message)
 
             match name:
                 case Iso.IMAGE_HEADER:
                     header = struct.unpack("!II5B", data)
-                    (width, height, bit_depth, color_type,
-                     compression_method, filter_method, interlace_method) = header
+                    (self.width, self.height, self.bit_depth, self.color_type,
+                     compression_method, filter_method, self.interlace_method) = header
                 case Iso.PALETTE:
-                    palette = tuple(struct.iter_unpack("!3B", data))
+                    self.palette = tuple(struct.iter_unpack("!3B", data))
                 case Iso.IMAGE_DATA:
-                    image_data.extend(data)
+                    self._image_data.extend(data)
+                    # fcTL before IDAT: the default image is the first frame
+                    self._default_image_is_frame = bool(frames)
                 case Iso.IMAGE_TRAILER:
                     pass
                 case Iso.TRANSPARENCY:
-                    match color_type:
+                    match self.color_type:
                         case 0:
-                            grey_sample, = struct.unpack("!H", data)
+                            self.transparent_sample = struct.unpack("!H", data)
                         case 2:
-                            rgb_sample = struct.unpack("!3H", data)
+                            self.transparent_sample = struct.unpack("!3H", data)
                         case 3:
-                            alpha_samples = tuple(struct.iter_unpack("!B", data))
-                            alpha_samples = tuple(s[0] for s in alpha_samples)
-                            missing_samples = len(palette) - len(alpha_samples)
+                            alpha_samples = tuple(data)
+                            missing_samples = len(self.palette) - len(alpha_samples)
                             if missing_samples > 0:
                                 alpha_samples += tuple([255] * missing_samples)
                             elif missing_samples < 0:
-                                raise PngDecodeError("too many alpha samples provided")
+                                error_message = "too many alpha samples provided"
+                                raise PngDecodeError(file, chunk_start, file.tell(), error_message)
+                            self.alpha_samples = alpha_samples
                         case 4 | 6:
                             pass  # full aplpha channel is already present
                 case Iso.PRIMARY_CHROMATICITIES_AND_WHITE_POINT:
                     color_space_info = struct.unpack("!8I", data)
                 case Iso.IMAGE_GAMMA:
                     image_gamma, = struct.unpack("!I", data)
-                    image_gamma *= 100000
+                    self.gamma = image_gamma / 100000
                 case Iso.EMBEDDED_ICC_PROFILE:
                     # Compression method at compressed[0]
                     profile_name, _, compressed = data.partition(b'\0')
                 case Iso.SIGNIFICANT_BITS:
                     # num_fields = (3 if color_type & 2 else 1) + (1 if color_type & 4 else 0)
-                    match color_type:
+                    match self.color_type:
                         case 0:
                             grey_sbits = struct.unpack("!B", data)
                         case 2 | 3:
@@ -117,61 +205,664 @@ class PngDecoder:
                     rendering_intent = struct.unpack("!B", data)
                 case Iso.TEXTUAL_DATA:
                     keyword, _, text_string = data.partition(b'\0')
+                    self.text[keyword.decode("latin-1")] = text_string.decode("latin-1")
                 case Iso.COMPRESSED_TEXTUAL_DATA:
                     keyword, _, compressed_text = data.partition(b'\0')
                 case Iso.INTERNATIONAL_TEXTUAL_DATA:
                     pass  # TODO
                 case Iso.BACKGROUND_COLOUR:
-                    match color_type:
+                    match self.color_type:
                         case 0 | 4:
                             bkgd = struct.unpack("!H", data)
                         case 2 | 6:
                             bkgd = struct.unpack("!3H", data)
                         case 3:
-                            bkgd = palette[struct.unpack("!B", data)]
+                            bkgd = self.palette[data[0]]
                 case Iso.IMAGE_HISTOGRAM:
-                    histogram = struct.unpack(f"!{len(palette)}H", data)
+                    histogram = struct.unpack(f"!{len(self.palette)}H", data)
                 case Iso.PHYSICAL_PIXEL_DIMENSIONS:
                     ppu_x, ppu_y, unit_spec = struct.unpack("!IIB", data)
                 case Iso.SUGGESTED_PALETTE:
                     pass  # TODO
                 case Iso.IMAGE_LAST_MODIFICATION_TIME:
                     from datetime import datetime
-                    time_last_modified = datetime(*struct.unpack("!H5B", data))
+                    self.time_last_modified = datetime(*struct.unpack("!H5B", data))
+                case Iso.ANIMATION_CONTROL:
+                    self.num_frames, self.num_plays = struct.unpack("!II", data)
+                case Iso.FRAME_CONTROL:
+                    frames.append((ApngFrameControl(*struct.unpack("!5I2H2B", data)), []))
+                case Iso.FRAME_DATA:
+                    if not frames:
+                        error_message = f"chunk {name} is not preceded by {Iso.FRAME_CONTROL}"
+                        raise PngDecodeError(file, chunk_start, file.tell(), error_message)
+                    frames[-1][1].append(data[Iso.SUB_CHUNK_SIZE:])  # skip sequence number
 
             self.chunks_read.append(name)
-            if not INFGEN:
+            chunk_order.record(name)
+            if self.verbose and not INFGEN:
                 print(f"decoded chunk {name}")
+        return None
 
-        image_data = zlib_decompress(image_data)
+    @property
+    def is_animated(self) -> bool:
+        return self.num_frames is not None
 
+    def _decode_image_data(self, compressed: bytes, width: int, height: int):
+        """
+        Inflate, unfilter and unpack a width x height image (the default
+        image or an APNG frame) into an RGBA array
+        """
         import numpy as np
+        if self.interlace_method != 0:
+            raise NotImplementedError("interlaced images are not supported")
+
+        channels = Iso.CHANNELS[self.color_type]
+        bits_per_pixel = channels * self.bit_depth
+        stride = (width * bits_per_pixel + 7) // 8
+        image_data = np.frombuffer(zlib_decompress(compressed), dtype=np.uint8)
+        if image_data.size < height * (stride + 1):
+            raise ValueError("image data is shorter than the image")
+
+        scanlines = image_data[:height * (stride + 1)].reshape(height, stride + 1)
+        rows = unfilter(scanlines, max(1, bits_per_pixel // 8))
+        samples = unpack_samples(rows, width * channels, self.bit_depth)
+        return self._to_rgba(samples.reshape(height, width, channels))
+
+    def _to_rgba(self, samples):
+        """
+        Convert (height, width, channels) samples of the image's color type
+        to 8-bit RGBA
+        """
+        import numpy as np
+        height, width, _ = samples.shape
+        if self.color_type == 3:
+            lookup = np.column_stack((np.array(self.palette, dtype=np.uint8).reshape(-1, 3),
+                                      np.array(self.alpha_samples, dtype=np.uint8)))
+            if samples.max(initial=0) >= len(lookup):
+                raise ValueError("palette index out of range")
+            return lookup[samples[..., 0]]
+
+        transparent = None
+        if self.transparent_sample is not None:
+            transparent = (samples == self.transparent_sample).all(axis=2)
+
+        # Scale samples to 8 bits
+        if self.bit_depth == 16:
+            samples = (samples >> 8).astype(np.uint8)
+        elif self.bit_depth < 8:
+            samples = samples * np.uint8(255 // ((1 << self.bit_depth) - 1))
+
         image = np.empty((height, width, 4), dtype=np.uint8)
+        match self.color_type:
+            case 0 | 4:  # greyscale (with alpha)
+                image[..., :3] = samples[..., :1]
+            case 2 | 6:  # truecolor (with alpha)
+                image[..., :3] = samples[..., :3]
+        if self.color_type & 4:
+            image[..., 3] = samples[..., -1]
+        else:
+            image[..., 3] = 255
+            if transparent is not None:
+                image[transparent, 3] = 0
+        return image
+
+    # Compact views of the image, computed from the array on demand
+
+    @property
+    def opaque_mask(self):
+        """
+        (height, width) boolean array, True where a pixel is not fully transparent
+        """
+        return self.image[..., 3] != 0
+
+    @property
+    def opaque_coordinates(self):
+        """
+        (rows, cols) index arrays of the pixels that are not fully transparent
+        """
+        return self.opaque_mask.nonzero()
+
+    @property
+    def packed_colors(self):
+        """
+        (height, width) uint32 array with each pixel's RGBA packed into one
+        integer (a view of the image, nothing is copied)
+        """
+        import numpy as np
+        return np.ascontiguousarray(self.image).view(np.uint32)[..., 0]
+
+    @property
+    def pixels(self) -> dict[tuple[int, int], tuple[int, int, int, int]]:
+        """
+        Compatibility accessor for the former per-pixel dict:
+        {(row, col): (r, g, b, a)} for every pixel that is not fully
+        transparent. It is rebuilt on every access, prefer the array views.
+        """
+        rows, cols = self.opaque_coordinates
+        colors = self.image[rows, cols].tolist()
+        return dict(zip(zip(rows.tolist(), cols.tolist()), map(tuple, colors)))
+
+
+class ApngDispose(IntEnum):
+    NONE = 0  # leave the frame on the canvas
+    BACKGROUND = 1  # clear the frame's region to transparent black
+    PREVIOUS = 2  # restore the region to what it was before the frame
+
+
+class ApngBlend(IntEnum):
+    SOURCE = 0  # replace the region with the frame
+    OVER = 1  # alpha-composite the frame over the region
+
+
+@dataclass(frozen=True)
+class ApngFrameControl:
+    sequence_number: int
+    width: int
+    height: int
+    x_offset: int
+    y_offset: int
+    delay_num: int
+    delay_den: int
+    dispose_op: ApngDispose
+    blend_op: ApngBlend
+
+    def __post_init__(self):
+        object.__setattr__(self, "dispose_op", ApngDispose(self.dispose_op))
+        object.__setattr__(self, "blend_op", ApngBlend(self.blend_op))
+
+    @property
+    def delay(self) -> float:
+        """
+        Seconds to show the frame for (a zero denominator means 1/100 s)
+        """
+        return self.delay_num / (self.delay_den or 100)
+
+    @property
+    def region(self) -> tuple[slice, slice]:
+        return (slice(self.y_offset, self.y_offset + self.height),
+                slice(self.x_offset, self.x_offset + self.width))
+
+
+class ApngAnimation:
+    """
+    Frames of an animated PNG. Frames are only inflated when requested and
+    are composed onto one reusable canvas by applying each frame's dispose
+    and blend operations in turn. Composed frames are kept in an LRU cache
+    bounded by cache_bytes; a request for an uncached frame resumes from the
+    closest cached frame before it instead of starting over.
+    """
+
+    DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, decoder: PngDecoder,
+                 frames: list[tuple[ApngFrameControl, list[bytes]]],
+                 num_plays: int = 0, default_image_is_frame: bool = False,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        import numpy as np
+        self._decoder = decoder
+        self.default_image_is_frame = default_image_is_frame
+        self.controls = [control for control, _ in frames]
+        self._data = [data for _, data in frames]
+        self.num_plays = num_plays  # 0 means loop forever
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+
+        for control in self.controls:
+            if (control.x_offset + control.width > decoder.width or
+                    control.y_offset + control.height > decoder.height):
+                raise ValueError(f"frame {control} does not fit in the image")
+
+        # Composition state: the canvas holds the output of frame
+        # self._next - 1 before its dispose operation has been applied
+        self._canvas = np.zeros((decoder.height, decoder.width, 4), dtype=np.uint8)
+        self._saved_region = None  # region under the last frame, for PREVIOUS
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.controls)
+
+    def __getitem__(self, index: int):
+        """
+        The composed, full-size RGBA image of a frame (read-only)
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("animation frame index out of range")
+
+        if (frame := self._cache.get(index)) is not None:
+            self._cache.move_to_end(index)
+            return frame
+
+        if index < self._next:
+            self._rewind(index)
+        while self._next <= index:
+            self._compose_next()
+        return self._remember(index, self._canvas)
+
+    @property
+    def delays(self) -> list[float]:
+        return [control.delay for control in self.controls]
+
+    def _compose_next(self) -> None:
+        import numpy as np
+        index = self._next
+        canvas = self._canvas
+
+        # Dispose of the previous frame
+        if index > 0:
+            previous = self.controls[index - 1]
+            dispose = previous.dispose_op
+            if dispose == ApngDispose.PREVIOUS and index - 1 == 0:
+                dispose = ApngDispose.BACKGROUND  # nothing to go back to
+            if dispose == ApngDispose.BACKGROUND:
+                canvas[previous.region] = 0
+            elif dispose == ApngDispose.PREVIOUS:
+                canvas[previous.region] = self._saved_region
+
+        control = self.controls[index]
+        region = control.region
+        if control.dispose_op == ApngDispose.PREVIOUS:
+            self._saved_region = canvas[region].copy()
+
+        if index == 0 and self.default_image_is_frame:
+            frame = self._decoder.image
+        else:
+            frame = self._decoder._decode_image_data(
+                b"".join(self._data[index]), control.width, control.height
+            )
+
+        if control.blend_op == ApngBlend.SOURCE:
+            canvas[region] = frame
+        else:
+            blend_over(canvas[region], frame)
+        self._next = index + 1
+
+    def _rewind(self, index: int) -> None:
+        """
+        Restore the canvas to the closest cached frame before index whose
+        disposal doesn't need the state before it, or to a blank canvas
+        """
+        for start in range(index - 1, -1, -1):
+            frame = self._cache.get(start)
+            if frame is not None and self.controls[start].dispose_op != ApngDispose.PREVIOUS:
+                self._canvas[:] = frame
+                self._next = start + 1
+                return
+        self._canvas[:] = 0
+        self._saved_region = None
+        self._next = 0
+
+    def _remember(self, index: int, canvas):
+        frame = canvas.copy()
+        frame.flags.writeable = False
+        if frame.nbytes > self.cache_bytes:
+            return frame
+
+        self._cache[index] = frame
+        while len(self._cache) * frame.nbytes > self.cache_bytes:
+            self._cache.popitem(last=False)
+        return frame
+
+
+def blend_over(destination, source) -> None:
+    """
+    Alpha-composite the RGBA source over destination, in place
+    """
+    import numpy as np
+    source_alpha = source[..., 3:4].astype(np.float32) / 255
+    destination_alpha = destination[..., 3:4].astype(np.float32) / 255
+    out_alpha = source_alpha + destination_alpha * (1 - source_alpha)
+
+    color = (source[..., :3] * source_alpha +
+             destination[..., :3] * destination_alpha * (1 - source_alpha))
+    np.divide(color, out_alpha, out=color, where=out_alpha > 0)
+    destination[..., :3] = np.rint(color)
+    destination[..., 3:4] = np.rint(out_alpha * 255)
+
+
+class PngFilter(IntEnum):
+    NONE = 0
+    SUB = 1  # difference from the pixel to the left
+    UP = 2  # difference from the pixel above
+    AVERAGE = 3  # difference from the mean of left and above
+    PAETH = 4  # difference from whichever of left, above, upper left is closest
+
+
+def unfilter(scanlines, bytes_per_pixel: int):
+    """
+    Reverse the filter of each scanline, given as a (height, 1 + stride)
+    array whose first column holds the filter types
+    """
+    import numpy as np
+    filters = scanlines[:, 0]
+    if filters.max(initial=0) > PngFilter.PAETH:
+        raise ValueError("unsupported filter method")
+    rows = scanlines[:, 1:].copy()
+    if not filters.any():
+        return rows
+
+    previous = np.zeros(rows.shape[1], dtype=np.uint8)
+    for y, filter_type in enumerate(filters.tolist()):
+        row = rows[y]
+        match filter_type:
+            case PngFilter.SUB:
+                # Each byte lane of a pixel is a running sum, modulo 256
+                lanes = row.reshape(-1, bytes_per_pixel)
+                np.cumsum(lanes, axis=0, dtype=np.uint8, out=lanes)
+            case PngFilter.UP:
+                row += previous
+            case PngFilter.AVERAGE | PngFilter.PAETH:
+                # Depends on the byte just reconstructed, so go byte by byte
+                data, up = row.tolist(), previous.tolist()
+                for i in range(len(data)):
+                    left = data[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+                    if filter_type == PngFilter.AVERAGE:
+                        predicted = (left + up[i]) >> 1
+                    else:
+                        upper_left = up[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+                        predicted = paeth_predictor(left, up[i], upper_left)
+                    data[i] = (data[i] + predicted) & 0xFF
+                row[:] = data
+        previous = row
+    return rows
+
+
+def paeth_predictor(left, up, upper_left):
+    """
+    Works on ints or on signed NumPy arrays
+    """
+    estimate = left + up - upper_left
+    distance_left = abs(estimate - left)
+    distance_up = abs(estimate - up)
+    distance_upper_left = abs(estimate - upper_left)
+    if isinstance(estimate, int):
+        if distance_left <= distance_up and distance_left <= distance_upper_left:
+            return left
+        return up if distance_up <= distance_upper_left else upper_left
+
+    import numpy as np
+    return np.where((distance_left <= distance_up) & (distance_left <= distance_upper_left),
+                    left, np.where(distance_up <= distance_upper_left, up, upper_left))
+
+
+def unpack_samples(rows, count: int, bit_depth: int):
+    """
+    The first count samples of each unfiltered row, one array element per
+    sample (uint16 for 16-bit images, uint8 otherwise)
+    """
+    import numpy as np
+    if bit_depth == 8:
+        return rows[:, :count]
+    if bit_depth == 16:
+        return rows.view(">u2")[:, :count].astype(np.uint16)
+    shifts = np.arange(8 - bit_depth, -1, -bit_depth, dtype=np.uint8)
+    samples = (rows[..., None] >> shifts) & ((1 << bit_depth) - 1)
+    return samples.reshape(len(rows), -1)[:, :count]
+
+
+class PngEncoder:
+    """
+    Writes NumPy images as 8-bit PNG files. The image is either:
+      - a (height, width, 4) RGBA or (height, width, 3) RGB array, saved as
+        truecolor (without the alpha channel if every pixel is opaque)
+      - a (height, width) array of palette indices, with palette a sequence
+        of up to 256 RGB or RGBA colors
+
+    filters is the PngFilter used for every row, or ADAPTIVE to choose each
+    row's filter with the minimum sum of absolute differences heuristic
+    (paletted images are left unfiltered, as filters rarely help them).
+    level is the zlib level, from 0 (stored, fastest) to 9 (smallest), for
+    compressor: the stdlib zlib.compress, or the pure-Python zlib_compress.
+    """
+
+    ADAPTIVE = "adaptive"
+    IDAT_SIZE = 1 << 16  # bytes of compressed data per IDAT chunk
+
+    def __init__(self, image, palette=None, filters: PngFilter | str = ADAPTIVE,
+                 level: int = 6, compressor=zlib.compress) -> None:
+        import numpy as np
+        image = np.asarray(image, dtype=np.uint8)
+        if filters != self.ADAPTIVE:
+            filters = PngFilter(filters)
+        if not -1 <= level <= 9:
+            raise ValueError(f"invalid compression level: {level}")
+        self.filters = filters
+        self.level = level
+        self.compressor = compressor
+
+        if palette is not None:
+            if image.ndim != 2:
+                raise ValueError("paletted images must be (height, width) arrays of indices")
+            palette = np.asarray(palette, dtype=np.uint8)
+            if not 0 < len(palette) <= 256 or palette.shape[1:] not in ((3,), (4,)):
+                raise ValueError("palette must hold 1 to 256 RGB or RGBA colors")
+            if image.max(initial=0) >= len(palette):
+                raise ValueError("palette index out of range")
+            self.color_type = 3
+            self.palette = palette
+            self.rows = image
+        else:
+            if image.ndim != 3 or image.shape[2] not in (3, 4):
+                raise ValueError("images must be (height, width, 3 or 4) arrays")
+            if image.shape[2] == 4 and (image[..., 3] == 255).all():
+                image = image[..., :3]
+            self.color_type = 6 if image.shape[2] == 4 else 2
+            self.palette = None
+            self.rows = image.reshape(image.shape[0], -1)
+
+        self.height, self.width = image.shape[:2]
+        self.bytes_per_pixel = Iso.CHANNELS[self.color_type]
+
+    @classmethod
+    def fast_decode(cls, image) -> "PngEncoder":
+        """
+        The profile PngDecoder reads fastest, for hot-path assets: a palette
+        when the image has at most 256 colors, no filters and stored
+        (uncompressed) deflate blocks, so decoding does no Huffman decoding
+        or unfiltering
+        """
+        if (paletted := to_palette(image)) is not None:
+            return cls(*paletted, filters=PngFilter.NONE, level=0)
+        return cls(image, filters=PngFilter.NONE, level=0)
+
+    def filtered_scanlines(self):
+        """
+        (height, 1 + stride) array of each row prefixed with its filter type
+        """
+        import numpy as np
+        filters = self.filters
+        if filters == self.ADAPTIVE:
+            filters = PngFilter.NONE if self.color_type == 3 else None
+
+        filter_types = list(PngFilter) if filters is None else [filters]
+        candidates = filter_rows(self.rows, self.bytes_per_pixel, filter_types)
+        choice = np.zeros(self.height, dtype=np.intp)
+        if len(filter_types) > 1:
+            # Signed residuals close to 0 compress best
+            costs = np.abs(candidates.view(np.int8), dtype=np.int32).sum(axis=2)
+            choice = costs.argmin(axis=0)
+
+        scanlines = np.empty((self.height, self.rows.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 0] = np.array(filter_types, dtype=np.uint8)[choice]
+        scanlines[:, 1:] = candidates[choice, np.arange(self.height)]
+        return scanlines
+
+    def encode(self) -> bytes:
+        header = struct.pack("!II5B", self.width, self.height, 8, self.color_type, 0, 0, 0)
+        chunks = [png_chunk(Iso.IMAGE_HEADER, header)]
+        if self.palette is not None:
+            chunks.append(png_chunk(Iso.PALETTE, self.palette[:, :3].tobytes()))
+            if self.palette.shape[1] == 4:
+                alpha = self.palette[:, 3].tobytes().rstrip(b"\xff")  # 255 is implied
+                if alpha:
+                    chunks.append(png_chunk(Iso.TRANSPARENCY, alpha))
+
+        image_data = self.compressor(self.filtered_scanlines().tobytes(), self.level)
+        for start in range(0, len(image_data), self.IDAT_SIZE):
+            chunks.append(png_chunk(Iso.IMAGE_DATA, image_data[start:start + self.IDAT_SIZE]))
+        chunks.append(png_chunk(Iso.IMAGE_TRAILER, b""))
+        return Iso.SIGNATURE + b"".join(chunks)
+
+    def save(self, filename: str) -> None:
+        with open(filename, "wb") as file:
+            file.write(self.encode())
+
+
+def filter_rows(rows, bytes_per_pixel: int, filter_types: Sequence[PngFilter]):
+    """
+    (len(filter_types), height, stride) array of the rows filtered with each
+    filter type. Filters only look at unfiltered bytes, so every row and
+    filter is computed at once.
+    """
+    import numpy as np
+    filtered = np.empty((len(filter_types), *rows.shape), dtype=np.uint8)
+    if list(filter_types) == [PngFilter.NONE]:
+        filtered[0] = rows
+        return filtered
+
+    current = rows.astype(np.int16)
+    left = np.zeros_like(current)
+    left[:, bytes_per_pixel:] = current[:, :-bytes_per_pixel]
+    up = np.zeros_like(current)
+    up[1:] = current[:-1]
+
+    for i, filter_type in enumerate(filter_types):
+        match filter_type:
+            case PngFilter.NONE:
+                predicted = 0
+            case PngFilter.SUB:
+                predicted = left
+            case PngFilter.UP:
+                predicted = up
+            case PngFilter.AVERAGE:
+                predicted = (left + up) >> 1
+            case PngFilter.PAETH:
+                upper_left = np.zeros_like(current)
+                upper_left[1:, bytes_per_pixel:] = current[:-1, :-bytes_per_pixel]
+                predicted = paeth_predictor(left, up, upper_left)
+        filtered[i] = (current - predicted) & 0xFF
+    return filtered
+
+
+def to_palette(image):
+    """
+    (indices, palette) for an RGBA image with at most 256 distinct colors,
+    otherwise None
+    """
+    import numpy as np
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    if image.ndim != 3 or image.shape[2] != 4:
+        return None
+    colors, indices = np.unique(image.view(np.uint32)[..., 0], return_inverse=True)
+    if len(colors) > 256:
+        return None
+    palette = colors.view(np.uint8).reshape(-1, 4)
+    return indices.reshape(image.shape[:2]).astype(np.uint8), palette
+
+
+def png_chunk(name: str, data: bytes) -> bytes:
+    name = name.encode(Iso.CHUNK_NAME_ENCODING)
+    crc = zlib.crc32(name + data)
+    return struct.pack("!I", len(data)) + name + data + struct.pack("!I", crc)
+
+
+class SharedImage:
+    """
+    Decoded RGBA image stored in a shared memory block, so it can be handed
+    between processes without pickling the pixels. Call close() (or use it
+    as a context manager) to free the block once the image is no longer
+    needed.
+    """
+
+    def __init__(self, name: str, shape: tuple[int, int, int]) -> None:
+        import numpy as np
+        self._shm = SharedMemory(name=name)
+        self.image = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf)
+        self.height, self.width, _ = shape
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        del self.image  # release the buffer before closing the block
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
 
-        pixels = {}
-        bb = BitBuffer(image_data)
-        for row in range(height):
-            filter_type = bb.read(8)
-            if filter_type != 0:
-                raise NotImplementedError("unsupported filter method")
-
-            samples_per_byte = bb.BYTE_LENGTH // bit_depth
-            bytes_per_row = width // samples_per_byte
-            col = 0
-            for _ in range(bytes_per_row):
-                byte_data = tuple(bb.iter_read(samples_per_byte, bit_depth))
-                for sample in reversed(byte_data):
-                    r, g, b = palette[sample]
-                    alpha = alpha_samples[sample]
-                    image[row][col] = (r, g, b, alpha)
-                    if alpha != 0:
-                        pixels[row, col] = (r, g, b, alpha)
-                    col += 1
-
-        self.image = image
-        self.pixels = pixels
-        self.width = width
-        self.height = height
+def decode_many(paths: Iterable[str], workers: int = None,
+                check_crc=True) -> list[SharedImage]:
+    """
+    Decode several PNG files in parallel across a process pool. Images are
+    returned in the order of paths, each backed by shared memory.
+    """
+    paths = list(paths)
+    images = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_decode_to_shared_memory, path, check_crc)
+                   for path in paths]
+        try:
+            for future in futures:
+                images.append(SharedImage(*future.result()))
+        except BaseException:
+            # Free every block that was created before the failure
+            for image in images:
+                image.close()
+            for future in futures[len(images) + 1:]:
+                if not future.cancel() and future.exception() is None:
+                    SharedImage(*future.result()).close()
+            raise
+    return images
+
+
+def _decode_to_shared_memory(path: str, check_crc: bool) -> tuple[str, tuple[int, int, int]]:
+    import numpy as np
+    # Per-chunk logs from workers would interleave
+    image = PngDecoder(path, check_crc, verbose=False).image
+
+    shm = SharedMemory(create=True, size=max(image.nbytes, 1))
+    np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+    # The block is handed over to the parent process, which unlinks it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name, image.shape
+
+
+# Order in which code length code lengths are stored (RFC 1951 3.2.7)
+CLEN_ORDER = (
+    16, 17, 18, 0, 8, 7, 9, 6, 10, 5,
+    11, 4, 12, 3, 13, 2, 14, 1, 15
+)
+# symbol: (extra bits, base value) of lengths and distances (RFC 1951 3.2.5)
+LENGTH_EXTRA_BITS = {
+    257: (0, 3), 258: (0, 4), 259: (0, 5),
+    260: (0, 6), 261: (0, 7), 262: (0, 8),
+    263: (0, 9), 264: (0, 10), 265: (1, 11),
+    266: (1, 13), 267: (1, 15), 268: (1, 17),
+    269: (2, 19), 270: (2, 23), 271: (2, 27),
+    272: (2, 31), 273: (3, 35), 274: (3, 43),
+    275: (3, 51), 276: (3, 59), 277: (4, 67),
+    278: (4, 83), 279: (4, 99), 280: (4, 115),
+    281: (5, 131), 282: (5, 163), 283: (5, 195),
+    284: (5, 227), 285: (0, 258)
+}
+DIST_EXTRA_BITS = {
+    0: (0, 1), 1: (0, 2), 2: (0, 3), 3: (0, 4),
+    4: (1, 5), 5: (1, 7), 6: (2, 9), 7: (2, 13),
+    8: (3, 17), 9: (3, 25), 10: (4, 33), 11: (4, 49),
+    12: (5, 65), 13: (5, 97), 14: (6, 129), 15: (6, 193),
+    16: (7, 257), 17: (7, 385), 18: (8, 513), 19: (8, 769),
+    20: (9, 1025), 21: (9, 1537), 22: (10, 2049), 23: (10, 3073),
+    24: (11, 4097), 25: (11, 6145), 26: (12, 8193), 27: (12, 12289),
+    28: (13, 16385), 29: (13, 24577)
+}
+DIST_BASES = tuple(base for _, base in DIST_EXTRA_BITS.values())
 
 
 def zlib_decompress(image_data):
@@ -207,9 +898,11 @@ def zlib_decompress(image_data):
             bitstream.align_to_next_byte()
             LEN = bitstream.read(16)
             NLEN = bitstream.read(16)
-            assert LEN == ~NLEN
-            literal_data = bitstream.read_bytes(LEN)
-            decompressed.extend(literal_data)
+            if LEN != NLEN ^ 0xFFFF:
+                raise ValueError("stored block length does not match its complement")
+            decompressed.extend(bitstream.read_bytes(LEN))
+            if INFGEN:
+                print("stored", LEN)
         elif (block_type == 0b11):  # reserved (error)
             raise ValueError("invalid block type")
         else:
@@ -218,11 +911,6 @@ def zlib_decompress(image_data):
                 HLIT = bitstream.read(5) + 257  # number of Literal/Length codes
                 HDIST = bitstream.read(5) + 1  # number of Distance codes
                 HCLEN = bitstream.read(4) + 4  # number of Code Length codes
-
-                CLEN_ORDER = (
-                    16, 17, 18, 0, 8, 7, 9, 6, 10, 5,
-                    11, 4, 12, 3, 13, 2, 14, 1, 15
-                )
                 clen_lengths = [0] * len(CLEN_ORDER)
                 for i in range(HCLEN):
                     clen_lengths[CLEN_ORDER[i]] = bitstream.read(3)
@@ -243,8 +931,10 @@ def zlib_decompress(image_data):
                         print('! litlen', v, l)
                     for v, l in dist_tree.pairs():
                         print('! dist', v, l)
-            else:
-                raise NotImplementedError("have not yet implemented block type 0b01")
+            else:  # compressed with fixed Huffman codes
+                lit_len_tree, dist_tree = fixed_huffman_trees()
+                if INFGEN:
+                    print("fixed")
 
             while True:
                 code = bitstream.read_huffman_code(lit_len_tree)
@@ -260,28 +950,6 @@ def zlib_decompress(image_data):
                         else:
                             print('literal', code)
                 else:  # length
-                    LENGTH_EXTRA_BITS = {
-                        257: (0, 3), 258: (0, 4), 259: (0, 5),
-                        260: (0, 6), 261: (0, 7), 262: (0, 8),
-                        263: (0, 9), 264: (0, 10), 265: (1, 11),
-                        266: (1, 13), 267: (1, 15), 268: (1, 17),
-                        269: (2, 19), 270: (2, 23), 271: (2, 27),
-                        272: (2, 31), 273: (3, 35), 274: (3, 43),
-                        275: (3, 51), 276: (3, 59), 277: (4, 67),
-                        278: (4, 83), 279: (4, 99), 280: (4, 115),
-                        281: (5, 131), 282: (5, 163), 283: (5, 195),
-                        284: (5, 227), 285: (0, 258)
-                    }
-                    DIST_EXTRA_BITS = {
-                        0: (0, 1), 1: (0, 2), 2: (0, 3), 3: (0, 4),
-                        4: (1, 5), 5: (1, 7), 6: (2, 9), 7: (2, 13),
-                        8: (3, 17), 9: (3, 25), 10: (4, 33), 11: (4, 49),
-                        12: (5, 65), 13: (5, 97), 14: (6, 129), 15: (6, 193),
-                        16: (7, 257), 17: (7, 385), 18: (8, 513), 19: (8, 769),
-                        20: (9, 1025), 21: (9, 1537), 22: (10, 2049), 23: (10, 3073),
-                        24: (11, 4097), 25: (11, 6145), 26: (12, 8193), 27: (12, 12289),
-                        28: (13, 16385), 29: (13, 24577)
-                    }
                     extra_bits, base_length = LENGTH_EXTRA_BITS[code]
                     length = bitstream.read(extra_bits) + base_length
 
@@ -296,16 +964,7 @@ def zlib_decompress(image_data):
 
                     if INFGEN:
                         print("match", length, dist)
-    s1 = 1
-    s2 = 0
-    for byte in decompressed:
-        s1 += byte
-        s2 += s1
-    s1 %= 65521
-    s2 %= 65521
-
-    assert ADLER32_S1 == s1
-    assert ADLER32_S2 == s2
+    assert adler32(decompressed) == ADLER32_S2 << 16 | ADLER32_S1
 
     if INFGEN:
         print("\n!\nadler")
@@ -313,6 +972,25 @@ def zlib_decompress(image_data):
     return decompressed
 
 
+@cache
+def shared_crc() -> "Crc":
+    """
+    One Crc for every decoder, so its table is only built once
+    """
+    return Crc()
+
+
+@cache
+def fixed_huffman_trees() -> tuple["HuffmanTree", "HuffmanTree"]:
+    """
+    The literal/length and distance trees of block type 0b01 (RFC 1951 3.2.6)
+    """
+    lit_len_lengths, dist_lengths = fixed_huffman_lengths()
+    lit_len_tree = HuffmanTree(tuple(range(288)), lit_len_lengths)
+    dist_tree = HuffmanTree(tuple(range(30)), dist_lengths)
+    return lit_len_tree, dist_tree
+
+
 class HuffmanTree:
     def __init__(self, alphabet: Sequence[int], code_lengths: Sequence[int]):
         if len(alphabet) != len(code_lengths):
@@ -385,7 +1063,10 @@ class BitBuffer:
     def read_bytes(self, n: int):
         if not self.is_byte_aligned():
             raise NotImplementedError
-        byte_index = self.index % self.BYTE_LENGTH
+        byte_index = self.index // self.BYTE_LENGTH
+        if byte_index + n > len(self.buffer):
+            raise IndexError
+        self.index += n * self.BYTE_LENGTH
         return self.buffer[byte_index: byte_index + n]
 
     def read_huffman_code(self, tree: HuffmanTree):
@@ -434,8 +1115,8 @@ class BitBuffer:
         return (self.index % self.BYTE_LENGTH) == 0
 
     def align_to_next_byte(self):
-        byte_index = self.index // self.BYTE_LENGTH
-        self.index = (byte_index + 1) * self.BYTE_LENGTH
+        byte_index = -(-self.index // self.BYTE_LENGTH)  # round up
+        self.index = byte_index * self.BYTE_LENGTH
 
     def __len__(self):
         return self.len
@@ -498,6 +1179,442 @@ class BitBuffer:
         )
 
 
+class BitWriter:
+    """
+    Packs values into bytes from the least significant bit, the way deflate
+    streams are read by BitBuffer
+    """
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self._bits = 0
+        self._bit_count = 0
+
+    def write(self, value: int, n: int) -> None:
+        self._bits |= value << self._bit_count
+        self._bit_count += n
+        if self._bit_count >= 32:
+            whole_bytes = self._bit_count // 8
+            self.buffer += (self._bits & ((1 << whole_bytes * 8) - 1)).to_bytes(whole_bytes, "little")
+            self._bits >>= whole_bytes * 8
+            self._bit_count -= whole_bytes * 8
+
+    def align_to_next_byte(self) -> None:
+        self.write(0, -self._bit_count % 8)
+        self.buffer += self._bits.to_bytes(self._bit_count // 8, "little")
+        self._bits = self._bit_count = 0
+
+    def take(self) -> bytes:
+        """
+        Remove and return the whole bytes written so far
+        """
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class Deflater:
+    """
+    Streaming zlib/deflate compressor. Matches are found with LZ77 over a
+    32 KiB window using hash chains: every position is filed under a hash of
+    its next 3 bytes, and up to max_chain earlier positions with the same
+    hash are tried, stopping early at a match of nice_length. Each block is
+    written with whichever of dynamic Huffman codes (length limited with
+    package-merge), fixed codes or no compression is smallest.
+
+    compress() may be called any number of times; flush() ends the stream.
+    """
+
+    WINDOW_SIZE = 1 << 15
+    MIN_MATCH = 3
+    MAX_MATCH = 258
+    BLOCK_TOKENS = 1 << 14  # literals and matches per block
+    MAX_STORED = 0xFFFF  # bytes per stored block
+
+    # level: (max_chain, nice_length), after zlib's configuration table
+    LEVELS = {
+        1: (4, 8), 2: (8, 16), 3: (32, 32), 4: (16, 16), 5: (32, 32),
+        6: (128, 128), 7: (256, 128), 8: (1024, 258), 9: (4096, 258),
+    }
+
+    def __init__(self, level: int = 6, max_chain: int = None, nice_length: int = None) -> None:
+        if level == -1:
+            level = 6
+        if not 0 <= level <= 9:
+            raise ValueError(f"invalid compression level: {level}")
+        default_chain, default_nice = self.LEVELS.get(level, (0, 0))
+        self.level = level
+        self.max_chain = default_chain if max_chain is None else max_chain
+        self.nice_length = min(default_nice if nice_length is None else nice_length,
+                               self.MAX_MATCH)
+
+        self._writer = BitWriter()
+        self._adler = 1
+        self._window = bytearray()  # recent history followed by unprocessed input
+        self._offset = 0  # stream position of self._window[0]
+        self._position = 0  # window index of the next byte to process
+        self._block_start = 0  # window index where the current block starts
+        self._tokens = []  # literal bytes, or (length, distance) matches
+        self._head = {}  # hash -> latest stream position with it
+        self._previous = [-1] * self.WINDOW_SIZE  # stream position -> previous with its hash
+        self._finished = False
+
+        # zlib header: deflate with a 32 KiB window, check bits so it divides by 31
+        flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+        cmf, flg = 0x78, flevel << 6
+        self._writer.write(cmf | (flg + 31 - (cmf << 8 | flg) % 31) << 8, 16)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._finished:
+            raise ValueError("the stream was already flushed")
+        self._adler = adler32(data, self._adler)
+        self._window += data
+        self._process(final=False)
+        return self._writer.take()
+
+    def flush(self) -> bytes:
+        """
+        Compress any remaining input and end the stream
+        """
+        if self._finished:
+            raise ValueError("the stream was already flushed")
+        self._process(final=True)
+        self._finished = True
+        self._writer.align_to_next_byte()
+        return self._writer.take() + self._adler.to_bytes(4, "big")
+
+    def _process(self, final: bool) -> None:
+        if self.level == 0:
+            end = len(self._window)
+            while end - self._block_start > self.MAX_STORED:
+                self._write_stored(self._block_start + self.MAX_STORED, final=False)
+            if final:
+                self._write_stored(end, final=True)
+            self._position = end
+            self._trim()
+            return
+
+        # Without the final input, keep enough lookahead for a maximal match
+        lookahead = 0 if final else self.MAX_MATCH
+        while self._position < len(self._window) - lookahead:
+            self._find_matches(len(self._window) - lookahead)
+            if len(self._tokens) >= self.BLOCK_TOKENS:
+                self._write_block(final=False)
+                self._trim()
+        if final:
+            self._write_block(final=True)
+        self._trim()
+
+    def _find_matches(self, end: int) -> None:
+        """
+        Tokenize from the current position up to end, or until the block is full
+        """
+        window, tokens = self._window, self._tokens
+        head, previous = self._head, self._previous
+        offset, position = self._offset, self._position
+        window_length = len(window)
+        mask = self.WINDOW_SIZE - 1
+        max_chain, nice_length = self.max_chain, self.nice_length
+
+        while position < end and len(tokens) < self.BLOCK_TOKENS:
+            if position + self.MIN_MATCH > window_length:
+                tokens.append(window[position])
+                position += 1
+                continue
+
+            key = window[position] << 16 | window[position + 1] << 8 | window[position + 2]
+            stream_position = offset + position
+            candidate = head.get(key, -1)
+            limit = max(stream_position - self.WINDOW_SIZE, -1)
+            max_length = min(self.MAX_MATCH, window_length - position)
+            best_length = best_distance = 0
+            chain = max_chain
+            while candidate > limit and chain:
+                start = candidate - offset
+                if window[start + best_length] == window[position + best_length]:
+                    length = 0
+                    while length < max_length and window[start + length] == window[position + length]:
+                        length += 1
+                    if length > best_length:
+                        best_length, best_distance = length, stream_position - candidate
+                        if length >= nice_length or length == max_length:
+                            break
+                next_candidate = previous[candidate & mask]
+                if next_candidate >= candidate:
+                    break  # the slot was reused by a newer position
+                candidate = next_candidate
+                chain -= 1
+
+            if best_length >= self.MIN_MATCH:
+                tokens.append((best_length, best_distance))
+                advance = best_length
+            else:
+                tokens.append(window[position])
+                advance = 1
+
+            # File every position covered by this token under its hash
+            for _ in range(advance):
+                if position + self.MIN_MATCH <= window_length:
+                    key = window[position] << 16 | window[position + 1] << 8 | window[position + 2]
+                    stream_position = offset + position
+                    previous[stream_position & mask] = head.get(key, -1)
+                    head[key] = stream_position
+                position += 1
+
+        self._position = position
+
+    def _trim(self) -> None:
+        """
+        Drop history that is out of reach of both matches and the current block
+        """
+        excess = min(self._position - self.WINDOW_SIZE, self._block_start)
+        if excess >= self.WINDOW_SIZE:
+            del self._window[:excess]
+            self._offset += excess
+            self._position -= excess
+            self._block_start -= excess
+
+    def _write_block(self, final: bool) -> None:
+        tokens, self._tokens = self._tokens, []
+        block_end = self._position
+        raw_length = block_end - self._block_start
+
+        symbols = []  # (lit/len symbol, extra bits, extra value, dist symbol, extra bits, extra value)
+        lit_len_frequencies = [0] * 286
+        dist_frequencies = [0] * 30
+        length_codes, distance_code = deflate_length_codes(), deflate_distance_code
+        for token in tokens:
+            if isinstance(token, int):
+                symbols.append((token,))
+                lit_len_frequencies[token] += 1
+            else:
+                length, distance = token
+                dist_symbol, dist_extra_bits, dist_extra = distance_code(distance)
+                symbol = (*length_codes[length], dist_symbol, dist_extra_bits, dist_extra)
+                symbols.append(symbol)
+                lit_len_frequencies[symbol[0]] += 1
+                dist_frequencies[dist_symbol] += 1
+        lit_len_frequencies[256] += 1  # end of block
+
+        extra_bits = sum(s[1] + s[4] for s in symbols if len(s) > 1)
+        dynamic = DynamicHuffmanHeader(lit_len_frequencies, dist_frequencies)
+        dynamic_size = dynamic.size + extra_bits + sum(
+            f * l for f, l in zip(lit_len_frequencies, dynamic.lit_len_lengths)
+        ) + sum(f * l for f, l in zip(dist_frequencies, dynamic.dist_lengths))
+        fixed_lit_len, fixed_dist = fixed_huffman_lengths()
+        fixed_size = extra_bits + sum(
+            f * l for f, l in zip(lit_len_frequencies, fixed_lit_len)
+        ) + 5 * sum(dist_frequencies)
+        stored_size = 8 * raw_length + 40 * (raw_length // self.MAX_STORED + 1)
+
+        if stored_size < min(dynamic_size, fixed_size):
+            end = self._block_start + raw_length
+            while True:
+                block_end = min(end, self._block_start + self.MAX_STORED)
+                self._write_stored(block_end, final and block_end == end)
+                if block_end == end:
+                    return
+
+        writer = self._writer
+        writer.write(final, 1)
+        if dynamic_size < fixed_size:
+            writer.write(0b10, 2)
+            dynamic.write(writer)
+            lit_len_lengths, dist_lengths = dynamic.lit_len_lengths, dynamic.dist_lengths
+        else:
+            writer.write(0b01, 2)
+            lit_len_lengths, dist_lengths = fixed_lit_len, fixed_dist
+
+        lit_len_codes = reversed_canonical_codes(lit_len_lengths)
+        dist_codes = reversed_canonical_codes(dist_lengths)
+        write = writer.write
+        for symbol in symbols:
+            write(lit_len_codes[symbol[0]], lit_len_lengths[symbol[0]])
+            if len(symbol) > 1:
+                _, length_extra_bits, length_extra, dist_symbol, dist_extra_bits, dist_extra = symbol
+                write(length_extra, length_extra_bits)
+                write(dist_codes[dist_symbol], dist_lengths[dist_symbol])
+                write(dist_extra, dist_extra_bits)
+        write(lit_len_codes[256], lit_len_lengths[256])
+        self._block_start = block_end
+
+    def _write_stored(self, end: int, final: bool) -> None:
+        data = self._window[self._block_start:end]
+        self._writer.write(final, 1)
+        self._writer.write(0b00, 2)
+        self._writer.align_to_next_byte()
+        self._writer.write(len(data) | (len(data) ^ 0xFFFF) << 16, 32)
+        self._writer.align_to_next_byte()
+        self._writer.buffer += data
+        self._block_start = end
+
+
+class DynamicHuffmanHeader:
+    """
+    Code lengths for a dynamic block and the header describing them
+    """
+
+    def __init__(self, lit_len_frequencies: list[int], dist_frequencies: list[int]) -> None:
+        self.lit_len_lengths = limited_code_lengths(lit_len_frequencies, 15)
+        self.dist_lengths = limited_code_lengths(dist_frequencies, 15)
+        if not any(self.dist_lengths):
+            self.dist_lengths[0] = 1  # at least one distance code must be defined
+
+        self.num_lit_len = max(257, last_nonzero(self.lit_len_lengths) + 1)
+        self.num_dist = max(1, last_nonzero(self.dist_lengths) + 1)
+        # Runs are encoded per alphabet, as BitBuffer.read_code_lengths reads them
+        self.runs = (run_length_codes(self.lit_len_lengths[:self.num_lit_len]) +
+                     run_length_codes(self.dist_lengths[:self.num_dist]))
+
+        clen_frequencies = [0] * len(CLEN_ORDER)
+        for symbol, _, _ in self.runs:
+            clen_frequencies[symbol] += 1
+        self.clen_lengths = limited_code_lengths(clen_frequencies, 7)
+        self.num_clen = max(4, last_nonzero([self.clen_lengths[i] for i in CLEN_ORDER]) + 1)
+
+        self.size = 5 + 5 + 4 + 3 * self.num_clen + sum(
+            self.clen_lengths[symbol] + extra_bits for symbol, extra_bits, _ in self.runs
+        )
+
+    def write(self, writer: BitWriter) -> None:
+        writer.write(self.num_lit_len - 257, 5)
+        writer.write(self.num_dist - 1, 5)
+        writer.write(self.num_clen - 4, 4)
+        for symbol in CLEN_ORDER[:self.num_clen]:
+            writer.write(self.clen_lengths[symbol], 3)
+        codes = reversed_canonical_codes(self.clen_lengths)
+        for symbol, extra_bits, extra in self.runs:
+            writer.write(codes[symbol], self.clen_lengths[symbol])
+            writer.write(extra, extra_bits)
+
+
+def zlib_compress(data: bytes, level: int = 6) -> bytes:
+    """
+    Counterpart of zlib_decompress, and a drop-in for zlib.compress
+    """
+    deflater = Deflater(level)
+    return deflater.compress(data) + deflater.flush()
+
+
+def limited_code_lengths(frequencies: Sequence[int], max_length: int) -> list[int]:
+    """
+    Optimal Huffman code lengths no longer than max_length bits, found with
+    the package-merge algorithm. Unused symbols get length 0.
+    """
+    lengths = [0] * len(frequencies)
+    leaves = sorted((frequency, (symbol,)) for symbol, frequency in enumerate(frequencies)
+                    if frequency)
+    if len(leaves) == 1:
+        lengths[leaves[0][1][0]] = 1
+        return lengths
+    if len(leaves) > 1 << max_length:
+        raise ValueError(f"{len(leaves)} symbols cannot have codes of {max_length} bits or fewer")
+
+    # Each round pairs up the cheapest items into packages and merges them
+    # back with the leaves; a symbol's code length is the number of chosen
+    # items it appears in
+    items = leaves
+    for _ in range(max_length - 1):
+        packages = [(a[0] + b[0], a[1] + b[1]) for a, b in zip(items[::2], items[1::2])]
+        items = list(merge(leaves, packages, key=lambda item: item[0]))
+    for _, symbols in items[:2 * len(leaves) - 2]:
+        for symbol in symbols:
+            lengths[symbol] += 1
+    return lengths
+
+
+def reversed_canonical_codes(lengths: Sequence[int]) -> list[int]:
+    """
+    Canonical Huffman codes for the code lengths (as in HuffmanTree), bit
+    reversed so they can be written least significant bit first
+    """
+    bl_count = Counter(lengths)
+    bl_count[0] = 0
+    next_code = [0] * (max(lengths) + 2)
+    code = 0
+    for bits in range(1, len(next_code)):
+        code = (code + bl_count[bits - 1]) << 1
+        next_code[bits] = code
+
+    codes = [0] * len(lengths)
+    for symbol, length in enumerate(lengths):
+        if length:
+            codes[symbol] = int(format(next_code[length], "b").zfill(length)[::-1], 2)
+            next_code[length] += 1
+    return codes
+
+
+def run_length_codes(lengths: Sequence[int]) -> list[tuple[int, int, int]]:
+    """
+    Code lengths as (code length symbol, extra bits, extra value): symbol 16
+    repeats the previous length 3-6 times, 17 and 18 encode 3-10 and 11-138
+    zeros
+    """
+    runs = []
+    i = 0
+    while i < len(lengths):
+        length = lengths[i]
+        run = 1
+        while i + run < len(lengths) and lengths[i + run] == length:
+            run += 1
+        i += run
+
+        if length == 0:
+            while run >= 11:
+                repeat = min(run, 138)
+                runs.append((18, 7, repeat - 11))
+                run -= repeat
+            if run >= 3:
+                runs.append((17, 3, run - 3))
+                run = 0
+        else:
+            runs.append((length, 0, 0))
+            run -= 1
+            while run >= 3:
+                repeat = min(run, 6)
+                runs.append((16, 2, repeat - 3))
+                run -= repeat
+        runs.extend([(length, 0, 0)] * run)
+    return runs
+
+
+def last_nonzero(values: Sequence[int]) -> int:
+    return max((i for i, value in enumerate(values) if value), default=-1)
+
+
+@cache
+def deflate_length_codes() -> list[tuple[int, int, int]]:
+    """
+    Match length -> (length symbol, extra bits, extra value)
+    """
+    codes = [None] * (Deflater.MAX_MATCH + 1)
+    for symbol, (extra_bits, base) in LENGTH_EXTRA_BITS.items():
+        for length in range(base, min(base + (1 << extra_bits), Deflater.MAX_MATCH + 1)):
+            codes[length] = (symbol, extra_bits, length - base)  # 285 takes over 258
+    return codes
+
+
+def deflate_distance_code(distance: int) -> tuple[int, int, int]:
+    """
+    Match distance -> (distance symbol, extra bits, extra value)
+    """
+    symbol = bisect_right(DIST_BASES, distance) - 1
+    extra_bits, base = DIST_EXTRA_BITS[symbol]
+    return symbol, extra_bits, distance - base
+
+
+@cache
+def fixed_huffman_lengths() -> tuple[list[int], list[int]]:
+    return [8] * 144 + [9] * 112 + [7] * 24 + [8] * 8, [5] * 30
+
+
+def adler32(data: bytes, value: int = 1) -> int:
+    s1, s2 = value & 0xFFFF, value >> 16
+    s2 = (s2 + s1 * len(data) + sum(accumulate(data))) % 65521
+    s1 = (s1 + sum(data)) % 65521
+    return s2 << 16 | s1
+
+
 def unpack(buffer: bytes, format: str):
     # TODO incorporate into BitBuffer or remove
     offset = 0
@@ -554,6 +1671,12 @@ class PngChunk:
     conflicts: str | Sequence[str] = ()
     dependencies: str | Sequence[str] = ()
 
+    def __post_init__(self):
+        # Accept a single name for any of the constraints
+        for field in ("before", "after", "conflicts", "dependencies"):
+            if isinstance(value := getattr(self, field), str):
+                object.__setattr__(self, field, (value,))
+
     def __eq__(self, obj: object) -> bool:
         if isinstance(obj, str):
             return self.name == obj
@@ -597,6 +1720,21 @@ class Iso:
     SUGGESTED_PALETTE = 'sPLT'
     IMAGE_LAST_MODIFICATION_TIME = 'tIME'
 
+    # APNG Extension Chunks
+    # See https://wiki.mozilla.org/APNG_Specification
+    ANIMATION_CONTROL = 'acTL'
+    FRAME_CONTROL = 'fcTL'
+    FRAME_DATA = 'fdAT'
+
+    # Samples per pixel of each color type
+    CHANNELS = {
+        0: 1,  # greyscale
+        2: 3,  # truecolor
+        3: 1,  # indexed-color
+        4: 2,  # greyscale with alpha
+        6: 4,  # truecolor with alpha
+    }
+
     # See http://www.libpng.org/pub/png/spec/iso/index-object.html#5ChunkOrdering
     _DEFINED_CHUNKS = (
         PngChunk('IHDR', required=True, first=True),
@@ -617,6 +1755,9 @@ class Iso:
         PngChunk('iTXt', multiple=True),
         PngChunk('tEXt', multiple=True),
         PngChunk('zTXt', multiple=True),
+        PngChunk('acTL', before="IDAT"),
+        PngChunk('fcTL', multiple=True),
+        PngChunk('fdAT', multiple=True, after="IDAT"),
     )
     _REQUIRED_CHUNKS = set(pc.name for pc in _DEFINED_CHUNKS if pc.required)
     _CHUNK_MAP = {pc.name: pc for pc in _DEFINED_CHUNKS}
@@ -626,8 +1767,15 @@ class Iso:
 
     @classmethod
     def can_parse_chunk(cls, name: str, chunks_read: list[str], suppress=True) -> bool:
+        """
+        Check a chunk against a list of the chunks before it. This replays
+        the whole list, use a ChunkOrderValidator when reading chunk by chunk.
+        """
+        validator = ChunkOrderValidator()
         try:
-            cls._check_chunk_ordering(name, chunks_read)
+            for chunk in chunks_read:
+                validator.record(chunk)
+            validator.check(name)
             return True
         except cls.ChunkError as e:
             if suppress:
@@ -636,60 +1784,97 @@ class Iso:
                 raise e
 
     @classmethod
-    def _check_chunk_ordering(cls, name: str, chunks_read: list[str]) -> None:
-        if name not in cls._CHUNK_MAP:
+    def chunk_is_critical(cls, name: str | bytes | bytearray) -> bool:
+        """
+        Test if the chunk is critical: the 5th bit of the first byte of
+        the name is not set (i.e. the first character is uppercase)
+        """
+        if isinstance(name, str):
+            name = name.encode(cls.CHUNK_NAME_ENCODING)
+        return not (name[0] & 0x20)
+
+
+class ChunkOrderValidator:
+    """
+    Incremental version of the chunk ordering rules in Iso: instead of
+    keeping the chunks read so far, it tracks per-chunk counts, the last
+    chunk and which chunks earlier ones have ruled out, so each new chunk is
+    checked in constant time however many IDAT chunks come before it.
+    """
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+        self.last_chunk = None
+        self.finished = False  # the last chunk (IEND) was read
+        self._ruled_out = {}  # chunk name -> (earlier chunk, reason)
+
+    def check(self, name: str) -> None:
+        """
+        Raise Iso.ChunkError if name can't come next
+        """
+        if (new_chunk := Iso._CHUNK_MAP.get(name)) is None:
             if not name.isprintable():
                 name = name.encode()
-            raise cls.ChunkError(f"chunk {name} not recognized")
-
-        new_chunk = cls._CHUNK_MAP[name]
+            raise Iso.ChunkError(f"chunk {name} not recognized")
 
         if new_chunk.first:
-            if chunks_read:
-                raise cls.ChunkError(f"chunk {name} is not first")
+            if self.last_chunk is not None:
+                raise Iso.ChunkError(f"chunk {name} is not first")
             return
-
-        dependencies = list(new_chunk.dependencies)
-        prev_i = None
-        for i, chunk in enumerate(chunks_read):
-            chunk_spec = cls._CHUNK_MAP[chunk]
-            if chunk_spec.last:
-                raise cls.ChunkError(f"last chunk was already read")
-            if new_chunk.name in chunk_spec.after:
-                raise cls.ChunkError(f"chunk {chunk} should come after {new_chunk}")
-            if chunk_spec.name in new_chunk.before:
-                raise cls.ChunkError(f"chunk {new_chunk} should come before {chunk}")
-            if chunk_spec == new_chunk:
-                if not new_chunk.multiple:
-                    raise cls.ChunkError(f"multiple {new_chunk} chunks not allowed")
-                if new_chunk.consecutive and prev_i is not None and prev_i != i - 1:
-                    raise cls.ChunkError(f"{new_chunk} chunks must be consecutive")
-                prev_i = i
-            if chunk_spec.name in new_chunk.conflicts:
-                raise cls.ChunkError(f"chunk {new_chunk} conflicts with {chunk}")
-            if new_chunk.name in chunk_spec.conflicts:
-                raise cls.ChunkError(f"chunk {chunk} conflicts with {new_chunk}")
-
-            if chunk_spec.name in dependencies:
-                dependencies.remove(chunk_spec)
-
-        if dependencies:
-            raise cls.ChunkError(f"{dependencies} must be read before chunk {new_chunk}")
+        if self.finished:
+            raise Iso.ChunkError(f"last chunk was already read")
+
+        if (ruled_out := self._ruled_out.get(name)) is not None:
+            chunk, reason = ruled_out
+            match reason:
+                case "after":
+                    raise Iso.ChunkError(f"chunk {chunk} should come after {new_chunk}")
+                case "conflicts":
+                    raise Iso.ChunkError(f"chunk {chunk} conflicts with {new_chunk}")
+        for chunk in new_chunk.before:
+            if self.counts[chunk]:
+                raise Iso.ChunkError(f"chunk {new_chunk} should come before {chunk}")
+        for chunk in new_chunk.conflicts:
+            if self.counts[chunk]:
+                raise Iso.ChunkError(f"chunk {new_chunk} conflicts with {chunk}")
+
+        if self.counts[name]:
+            if not new_chunk.multiple:
+                raise Iso.ChunkError(f"multiple {new_chunk} chunks not allowed")
+            if new_chunk.consecutive and self.last_chunk != name:
+                raise Iso.ChunkError(f"{new_chunk} chunks must be consecutive")
+
+        if missing := [chunk for chunk in new_chunk.dependencies if not self.counts[chunk]]:
+            raise Iso.ChunkError(f"{missing} must be read before chunk {new_chunk}")
 
         if new_chunk.last:
-            required = set(c for c in (*chunks_read, name) if c in cls._REQUIRED_CHUNKS)
-            if required != cls._REQUIRED_CHUNKS:
-                raise cls.ChunkError(f"required chunks were not read before last chunk")
+            if any(not self.counts[chunk] for chunk in Iso._REQUIRED_CHUNKS if chunk != name):
+                raise Iso.ChunkError(f"required chunks were not read before last chunk")
 
-    @classmethod
-    def chunk_is_critical(cls, name: str | bytes | bytearray) -> bool:
+    def record(self, name: str) -> None:
         """
-        Test if the chunk is critical: the 5th bit of the first byte of
-        the name is not set (i.e. the first character is uppercase)
+        Note that name was read, without checking it
         """
-        if isinstance(name, str):
-            name = name.encode(cls.CHUNK_NAME_ENCODING)
-        return not (name[0] & 0x20)
+        chunk = Iso._CHUNK_MAP[name]
+        if not self.counts[name]:
+            for later in chunk.after:
+                self._ruled_out.setdefault(later, (name, "after"))
+            for other in chunk.conflicts:
+                self._ruled_out.setdefault(other, (name, "conflicts"))
+        self.counts[name] += 1
+        self.last_chunk = name
+        self.finished = chunk.last
+
+    def add(self, name: str) -> None:
+        self.check(name)
+        self.record(name)
+
+    def can_add(self, name: str) -> bool:
+        try:
+            self.check(name)
+            return True
+        except Iso.ChunkError:
+            return False
 
 
 class Crc:
@@ -0,0 +1,319 @@
+from collections import deque
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count
+from math import inf
+
+from BoardUtils import Range
+from main import Car, ParkingLot
+
+State = bytes  # offset of each car along its axis, goal car first
+Move = tuple[int, int]  # (car index, distance), negative distances go left or up
+
+
+@dataclass(frozen=True)
+class Solution:
+    moves: tuple[Move, ...] | None  # None when the puzzle can't be solved
+    states_explored: int  # distinct states reached
+    nodes_expanded: int = 0  # states whose moves were generated, counting repeats
+
+    @property
+    def solvable(self) -> bool:
+        return self.moves is not None
+
+    def __len__(self) -> int:
+        return len(self.moves) if self.moves is not None else 0
+
+    def apply(self, lot: ParkingLot) -> None:
+        """
+        Play the moves on the lot they were found for
+        """
+        for index, distance in self.moves:
+            lot.move_car(lot.all_cars()[index], distance)
+
+
+class PuzzleSpace:
+    """
+    The states reachable from a ParkingLot. Each car can only slide along
+    its axis, so a state is just every car's offset along it, packed into
+    bytes (cheap to hash and to store in a visited set). The bitboard mask
+    of each car at each offset is computed once; a state's occupancy is the
+    union of its cars' masks.
+    """
+
+    def __init__(self, lot: ParkingLot) -> None:
+        if lot.goal_car is None:
+            raise ValueError("the parking lot has no goal car")
+        self.lot = lot
+        self.cars = lot.all_cars()
+        board = lot.board
+
+        # masks[i][offset]: cells of car i at that offset
+        self.masks: list[list[int]] = []
+        offsets = []
+        for car in self.cars:
+            if car.is_horizontal:
+                length = car.right - car.left
+                offsets.append(car.left)
+                self.masks.append([
+                    board.mask(Range((left, car.top), (left + length, car.bottom)))
+                    for left in range(lot.width - length)
+                ])
+            else:
+                length = car.bottom - car.top
+                offsets.append(car.top)
+                self.masks.append([
+                    board.mask(Range((car.left, top), (car.right, top + length)))
+                    for top in range(lot.height - length)
+                ])
+        self.initial: State = bytes(offsets)
+
+        exit_bit = board.bit(lot.exit_location)
+        self.goal_offsets = frozenset(
+            offset for offset, mask in enumerate(self.masks[0]) if mask & exit_bit
+        )
+
+        # corridors[offset]: for each goal offset, the cells the goal car
+        # sweeps to get there from offset
+        goal_masks = self.masks[0]
+        self.corridors = []
+        for offset in range(len(goal_masks)):
+            corridors = []
+            for target in self.goal_offsets:
+                corridor = 0
+                for between in range(min(offset, target), max(offset, target) + 1):
+                    corridor |= goal_masks[between]
+                corridors.append(corridor & ~goal_masks[offset])
+            self.corridors.append(corridors)
+
+    def occupancy(self, state: State) -> int:
+        occupied = 0
+        for masks, offset in zip(self.masks, state):
+            occupied |= masks[offset]
+        return occupied
+
+    def is_goal(self, state: State) -> bool:
+        return state[0] in self.goal_offsets
+
+    def heuristic(self, state: State) -> int:
+        """
+        Lower bound on the moves left: the goal car must move once, and so
+        must every car in its way. If one of those cars can't get out of the
+        way without some other car moving first, that is one more move.
+        """
+        if state[0] in self.goal_offsets:
+            return 0
+        cells = [masks[offset] for masks, offset in zip(self.masks, state)]
+        occupied = 0
+        for mask in cells:
+            occupied |= mask
+
+        best = inf
+        for corridor in self.corridors[state[0]]:
+            blockers = [i for i in range(1, len(cells)) if cells[i] & corridor]
+            estimate = 1 + len(blockers)
+            if blockers and estimate < best:
+                # Cars that aren't counted yet, with the blockers out of the way
+                fixed = occupied & ~cells[0]
+                for i in blockers:
+                    fixed &= ~cells[i]
+                if not all(self._can_clear(i, state[i], corridor, fixed) for i in blockers):
+                    estimate += 1
+            best = min(best, estimate)
+        return best
+
+    def _can_clear(self, car: int, offset: int, corridor: int, fixed: int) -> bool:
+        masks = self.masks[car]
+        for direction in (-1, 1):
+            new_offset = offset + direction
+            while 0 <= new_offset < len(masks) and not masks[new_offset] & fixed:
+                if not masks[new_offset] & corridor:
+                    return True
+                new_offset += direction
+        return False
+
+    def neighbours(self, state: State):
+        """
+        Yield (next state, move) for every car and every distance it can slide
+        """
+        occupied = self.occupancy(state)
+        for i, (masks, offset) in enumerate(zip(self.masks, state)):
+            others = occupied & ~masks[offset]
+            prefix, suffix = state[:i], state[i + 1:]
+            for direction in (-1, 1):
+                new_offset = offset + direction
+                while 0 <= new_offset < len(masks) and not masks[new_offset] & others:
+                    yield prefix + bytes((new_offset,)) + suffix, (i, new_offset - offset)
+                    new_offset += direction
+
+
+class TranspositionTable:
+    """
+    What IDA* has learned about states, in a fixed number of slots indexed by
+    hash: the depth a state was reached at in which iteration, and the best
+    lower bound on its remaining moves found by searching below it. When
+    two states share a slot, one from an earlier iteration or reached deeper
+    gives way (a shallower entry cuts off a bigger subtree).
+    """
+
+    def __init__(self, size: int = 1 << 18) -> None:
+        self.size = size
+        self.iteration = 0
+        self._slots: list[tuple[State, int, float, int] | None] = [None] * size
+        self.stored = 0
+        self.replacements = 0
+
+    def __iter__(self):
+        return (entry[0] for entry in self._slots if entry is not None)
+
+    def new_iteration(self) -> None:
+        self.iteration += 1
+
+    def get(self, state: State) -> tuple[int, float, int] | None:
+        """
+        (depth, remaining moves bound, iteration) for a stored state
+        """
+        entry = self._slots[hash(state) % self.size]
+        if entry is not None and entry[0] == state:
+            return entry[1:]
+        return None
+
+    def store(self, state: State, depth: int, estimate: float) -> None:
+        slot = hash(state) % self.size
+        entry = self._slots[slot]
+        if entry is None:
+            self.stored += 1
+        elif entry[0] != state:
+            if entry[3] == self.iteration and entry[1] < depth:
+                return
+            self.replacements += 1
+        self._slots[slot] = (state, depth, estimate, self.iteration)
+
+
+def solve(lot: ParkingLot, method: str = "bfs", **options) -> Solution:
+    """
+    Shortest solution (fewest moves, a move sliding one car any distance)
+    found by breadth-first search ("bfs"), A* ("astar") or IDA* ("idastar")
+    """
+    space = PuzzleSpace(lot)
+    match method:
+        case "bfs":
+            return bfs(space)
+        case "astar":
+            return astar(space)
+        case "idastar":
+            return idastar(space, **options)
+    raise ValueError(f"unknown search method: {method}")
+
+
+def bfs(space: PuzzleSpace) -> Solution:
+    start = space.initial
+    parents: dict[State, tuple[State, Move] | None] = {start: None}
+    frontier = deque([start])
+    expanded = 0
+    while frontier:
+        state = frontier.popleft()
+        if space.is_goal(state):
+            return Solution(backtrack(parents, state), len(parents), expanded)
+        expanded += 1
+        for next_state, move in space.neighbours(state):
+            if next_state not in parents:
+                parents[next_state] = (state, move)
+                frontier.append(next_state)
+    return Solution(None, len(parents), expanded)
+
+
+def astar(space: PuzzleSpace) -> Solution:
+    start = space.initial
+    costs = {start: 0}
+    parents: dict[State, tuple[State, Move] | None] = {start: None}
+    tie_breaker = count()
+    # Among equal estimates, expand the deepest state first
+    frontier = [(space.heuristic(start), 0, next(tie_breaker), start)]
+    expanded = 0
+    while frontier:
+        _, negative_cost, _, state = heappop(frontier)
+        cost = -negative_cost
+        if cost != costs[state]:
+            continue  # a shorter path to this state was queued since
+        if space.is_goal(state):
+            return Solution(backtrack(parents, state), len(costs), expanded)
+        expanded += 1
+        for next_state, move in space.neighbours(state):
+            if cost + 1 < costs.get(next_state, inf):
+                costs[next_state] = cost + 1
+                parents[next_state] = (state, move)
+                estimate = cost + 1 + space.heuristic(next_state)
+                if estimate < inf:
+                    heappush(frontier, (estimate, -cost - 1, next(tie_breaker), next_state))
+    return Solution(None, len(costs), expanded)
+
+
+def idastar(space: PuzzleSpace, table_size: int = 1 << 18,
+            max_moves: int | None = None) -> Solution:
+    """
+    Iterative deepening A*: depth-first searches with a growing bound on
+    moves made plus the heuristic, using memory only for the current path
+    and a transposition table of table_size slots. The table prunes states
+    already searched in the current iteration, and carries the bounds
+    learned in one iteration over to the next.
+
+    Proving a puzzle unsolvable takes a table big enough to hold every
+    reachable state; otherwise give up after max_moves. States explored
+    counts expansions, as states aren't remembered.
+    """
+    table = TranspositionTable(table_size)
+    path: list[Move] = []
+    expanded = 0
+    found = object()
+
+    def search(state: State, depth: int, bound: int):
+        nonlocal expanded
+        estimate = space.heuristic(state)
+        if (entry := table.get(state)) is not None:
+            seen_depth, learned, iteration = entry
+            estimate = max(estimate, learned)
+            if iteration == table.iteration and seen_depth <= depth:
+                # Already searched with at least this budget, or a cycle
+                return depth + estimate
+        if depth + estimate > bound:
+            return depth + estimate
+        if space.is_goal(state):
+            return found
+
+        table.store(state, depth, estimate)
+        expanded += 1
+        minimum = inf
+        for next_state, move in space.neighbours(state):
+            path.append(move)
+            result = search(next_state, depth + 1, bound)
+            if result is found:
+                return found
+            path.pop()
+            minimum = min(minimum, result)
+        table.store(state, depth, max(estimate, minimum - depth))
+        return minimum
+
+    bound = space.heuristic(space.initial)
+    while bound < inf and (max_moves is None or bound <= max_moves):
+        stored = table.stored
+        table.new_iteration()
+        result = search(space.initial, 0, bound)
+        if result is found:
+            return Solution(tuple(path), expanded, expanded)
+        if table.stored == stored and not table.replacements and all(
+                table.get(next_state) is not None
+                for state in table for next_state, _ in space.neighbours(state)):
+            break  # every reachable state has been searched
+        # Cut-off cycles report their heuristic bound, which may not exceed
+        # this one, but every path within it has been tried
+        bound = max(result, bound + 1)
+    return Solution(None, expanded, expanded)
+
+
+def backtrack(parents: dict[State, tuple[State, Move] | None], state: State) -> tuple[Move, ...]:
+    moves = []
+    while (parent := parents[state]) is not None:
+        state, move = parent
+        moves.append(move)
+    return tuple(reversed(moves))
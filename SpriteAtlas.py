@@ -0,0 +1,135 @@
+import json
+import os
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from PngCodec import PngDecoder
+
+
+@dataclass(frozen=True)
+class AtlasFrame:
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class SpriteAtlas:
+    """
+    Sprite sheet decoded once, with named sub-rectangles (frames). Indexing
+    the atlas by frame name gives a NumPy view into the sheet, so frames can
+    be passed to VirtualCanvas.add_sprite or an animation player without
+    copying pixels.
+
+    The sheet may be an RGBA array, a PngDecoder, or a filename. An
+    ImageCache can be given to load filenames through it.
+    """
+
+    def __init__(self, sheet: np.ndarray | PngDecoder | str,
+                 frames: Iterable[AtlasFrame], cache=None) -> None:
+        self.image = self._load_sheet(sheet, cache)
+
+        sheet_height, sheet_width = self.image.shape[:2]
+        self.frames: dict[str, AtlasFrame] = {}
+        for frame in frames:
+            if frame.name in self.frames:
+                raise ValueError(f"duplicate frame name: '{frame.name}'")
+            if (frame.x < 0 or frame.y < 0 or frame.width <= 0 or frame.height <= 0 or
+                    frame.x + frame.width > sheet_width or
+                    frame.y + frame.height > sheet_height):
+                raise ValueError(f"frame {frame} does not fit in the "
+                                 f"{sheet_width}x{sheet_height} sheet")
+            self.frames[frame.name] = frame
+
+    @classmethod
+    def from_grid(cls, sheet, frame_width: int, frame_height: int,
+                  names: Iterable[str] = None, margin: int = 0, spacing: int = 0,
+                  cache=None):
+        """
+        Frames laid out on a regular grid, read left to right then top to
+        bottom. Without names, frames are called "row,col".
+        """
+        image = cls._load_sheet(sheet, cache)
+        sheet_height, sheet_width = image.shape[:2]
+        columns = (sheet_width - 2 * margin + spacing) // (frame_width + spacing)
+        rows = (sheet_height - 2 * margin + spacing) // (frame_height + spacing)
+
+        cells = [(row, col) for row in range(rows) for col in range(columns)]
+        names = [f"{row},{col}" for row, col in cells] if names is None else list(names)
+        if len(names) > len(cells):
+            raise ValueError(f"{len(names)} names given for a grid of {len(cells)} frames")
+
+        return cls(image, (
+            AtlasFrame(name,
+                       margin + col * (frame_width + spacing),
+                       margin + row * (frame_height + spacing),
+                       frame_width, frame_height)
+            for name, (row, col) in zip(names, cells)
+        ))
+
+    @classmethod
+    def from_json(cls, sheet, sidecar: str = None, cache=None):
+        """
+        Frames described by a JSON sidecar, by default next to the sheet with
+        a .json extension. Accepted layouts:
+            {"grid": {"width": 16, "height": 16, "names": [...], "margin": 0, "spacing": 0}}
+            {"frames": {"name": {"x": 0, "y": 0, "w": 16, "h": 16}, ...}}
+            {"frames": [{"filename": "name", "frame": {"x": 0, ...}}, ...]}
+        The last two also accept TexturePacker's nested "frame" objects.
+        """
+        if sidecar is None:
+            if not isinstance(sheet, (str, os.PathLike)):
+                raise ValueError("a sidecar path is required when the sheet is not a file")
+            sidecar = os.path.splitext(sheet)[0] + ".json"
+        with open(sidecar) as file:
+            spec = json.load(file)
+
+        if "grid" in spec:
+            grid = spec["grid"]
+            return cls.from_grid(sheet, grid["width"], grid["height"], grid.get("names"),
+                                 grid.get("margin", 0), grid.get("spacing", 0), cache)
+
+        entries = spec["frames"]
+        if isinstance(entries, dict):
+            entries = [{"filename": name, **entry} for name, entry in entries.items()]
+
+        frames = []
+        for entry in entries:
+            rect = entry.get("frame", entry)
+            frames.append(AtlasFrame(entry["filename"], rect["x"], rect["y"],
+                                     rect["w"], rect["h"]))
+        return cls(sheet, frames, cache)
+
+    @staticmethod
+    def _load_sheet(sheet, cache) -> np.ndarray:
+        if isinstance(sheet, (str, os.PathLike)):
+            if cache is not None:
+                return cache.load(sheet)
+            return PngDecoder(sheet, verbose=False).image
+        return getattr(sheet, "image", sheet)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        frame = self.frames[name]
+        return self.image[frame.y:frame.y + frame.height, frame.x:frame.x + frame.width]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.frames
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.frames)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def sequence(self, names: Iterable[str] | str) -> list[np.ndarray]:
+        """
+        Views for an animation: either the given frame names in order, or
+        every frame whose name starts with the given prefix, in atlas order
+        """
+        if isinstance(names, str):
+            names = [name for name in self.frames if name.startswith(names)]
+        return [self[name] for name in names]
@@ -0,0 +1,65 @@
+"""
+Benchmarks for the decode and render hot paths.
+
+    python -m benchmarks                  # run and print the results
+    python -m benchmarks --save           # also store them as the baseline
+    python -m benchmarks --compare        # fail if slower than the baseline
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks import bench_decode, bench_render
+from benchmarks.harness import (
+    find_regressions,
+    format_results,
+    load_baseline,
+    save_baseline,
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SUITES = {
+    "decode": bench_decode.run,
+    "render": bench_render.run,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("suites", nargs="*", choices=[[], *SUITES], default=[],
+                        help="suites to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="use smaller inputs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="save results as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit with an error if any metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a metric counts as regressed")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.suites or SUITES:
+        SUITES[name](results, quick=args.quick)
+    print(format_results(results))
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\nno baseline at {args.baseline}, run with --save first")
+            return 1
+        regressions = find_regressions(load_baseline(args.baseline), results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s):", *regressions, sep="\n  ")
+            status = 1
+        else:
+            print("\nno regressions")
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"\nbaseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
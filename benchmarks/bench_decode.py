@@ -0,0 +1,246 @@
+import os
+import random
+import zlib
+
+from tempfile import TemporaryDirectory
+
+from benchmarks.fixtures import SEED, png_fixtures, random_bytes
+from benchmarks.harness import Results, measure
+from ImageCache import ImageCache
+from PngCodec import (
+    BitBuffer,
+    ChunkOrderValidator,
+    Crc,
+    HuffmanTree,
+    PngDecoder,
+    PngEncoder,
+    decode_many,
+    zlib_compress,
+    zlib_decompress,
+)
+
+MB = 1 << 20
+
+# Code lengths of the fixed literal/length tree from RFC 1951, a typical shape
+# for the trees found in dynamic blocks
+LITERAL_LENGTHS = [8] * 144 + [9] * 112 + [7] * 24 + [8] * 8
+
+
+def bench_png_decode(results: Results, sizes=(64, 256)) -> None:
+    with TemporaryDirectory() as directory:
+        for fixture in png_fixtures(sizes=sizes):
+            path = os.path.join(directory, f"{fixture.name}.png")
+            with open(path, "wb") as file:
+                file.write(fixture.data)
+
+            name = f"png_decode/{fixture.name}"
+            try:
+                seconds = measure(lambda: PngDecoder(path))
+            except Exception as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            results[name] = {
+                "mb_per_s": len(fixture.data) / seconds / MB,
+                "pixels_per_s": fixture.pixels / seconds,
+            }
+
+
+def bench_png_encode(results: Results, size: int = 256) -> None:
+    """
+    Encoding at several zlib levels, and decoding what each level produced
+    next to the fast-decode profile
+    """
+    fixture = next(f for f in png_fixtures(sizes=(size,), bit_depths=(8,))
+                   if f.compressibility == "medium")
+    with TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.png")
+        with open(source, "wb") as file:
+            file.write(fixture.data)
+        image = PngDecoder(source).image
+
+        encoders = {f"level-{level}": PngEncoder(image, level=level) for level in (1, 6, 9)}
+        encoders["fast-decode"] = PngEncoder.fast_decode(image)
+        for profile, encoder in encoders.items():
+            seconds = measure(encoder.encode)
+            data = encoder.encode()
+            results[f"png_encode/{fixture.name}-{profile}"] = {
+                "pixels_per_s": fixture.pixels / seconds,
+                "ratio": image.nbytes / len(data),
+            }
+
+            path = os.path.join(directory, f"{profile}.png")
+            encoder.save(path)
+            seconds = measure(lambda: PngDecoder(path))
+            results[f"png_decode/{fixture.name}-{profile}"] = {
+                "pixels_per_s": fixture.pixels / seconds,
+            }
+
+
+def bench_png_probe(results: Results, count: int = 200) -> None:
+    """
+    Reading only the metadata of a directory of assets
+    """
+    fixtures = png_fixtures(sizes=(64,))
+    with TemporaryDirectory() as directory:
+        paths = []
+        for i in range(count):
+            paths.append(os.path.join(directory, f"{i}.png"))
+            with open(paths[-1], "wb") as file:
+                file.write(fixtures[i % len(fixtures)].data)
+
+        seconds = measure(lambda: [PngDecoder.probe(path) for path in paths])
+        results[f"png_probe/{count}-files"] = {"files_per_s": count / seconds}
+
+
+def bench_decode_many(results: Results, size: int = 128, count: int = 16) -> None:
+    """
+    Batch decoding through the process pool, with one worker and with one
+    per core
+    """
+    fixtures = [f for f in png_fixtures(sizes=(size,), bit_depths=(8,))
+                if f.compressibility != "low"]
+    with TemporaryDirectory() as directory:
+        paths = []
+        for i in range(count):
+            fixture = fixtures[i % len(fixtures)]
+            paths.append(os.path.join(directory, f"{i}-{fixture.name}.png"))
+            with open(paths[-1], "wb") as file:
+                file.write(fixture.data)
+
+        def load(workers):
+            for image in decode_many(paths, workers=workers):
+                image.close()
+
+        for workers in sorted({1, os.cpu_count() or 1}):
+            seconds = measure(lambda: load(workers), repeat=1)
+            results[f"decode_many/{count}x{size}px-{workers}-workers"] = {
+                "images_per_s": count / seconds,
+            }
+
+
+def bench_image_cache(results: Results, size: int = 256) -> None:
+    fixture = next(f for f in png_fixtures(sizes=(size,), bit_depths=(8,))
+                   if f.compressibility == "medium")
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"{fixture.name}.png")
+        with open(path, "wb") as file:
+            file.write(fixture.data)
+
+        cache = ImageCache(os.path.join(directory, "cache"))
+        seconds = measure(lambda: (cache.clear(), cache.load(path)), repeat=1)
+        results[f"image_cache/{fixture.name}-cold"] = {"images_per_s": 1 / seconds}
+
+        cache.load(path)
+        seconds = measure(lambda: cache.load(path))
+        results[f"image_cache/{fixture.name}-warm"] = {"images_per_s": 1 / seconds}
+
+
+def bench_zlib_decompress(results: Results, size: int = 64 * 1024) -> None:
+    for compressibility in ("high", "medium", "low"):
+        data = random_bytes(size, compressibility)
+        compressed = zlib.compress(data, 9)
+        name = f"zlib_decompress/{size // 1024}KiB-{compressibility}"
+        try:
+            seconds = measure(lambda: zlib_decompress(compressed))
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        results[name] = {
+            "mb_per_s": size / seconds / MB,  # decompressed bytes
+            "ratio": size / len(compressed),
+        }
+
+
+def bench_zlib_compress(results: Results, size: int = 64 * 1024) -> None:
+    """
+    The pure-Python deflater next to the stdlib zlib at the same levels
+    """
+    for compressibility in ("high", "medium", "low"):
+        data = random_bytes(size, compressibility)
+        for level in (1, 6, 9):
+            for implementation, compress in (("python", zlib_compress), ("stdlib", zlib.compress)):
+                seconds = measure(lambda: compress(data, level))
+                name = f"zlib_compress/{size // 1024}KiB-{compressibility}-{level}-{implementation}"
+                results[name] = {
+                    "mb_per_s": size / seconds / MB,
+                    "ratio": size / len(compress(data, level)),
+                }
+
+
+def canonical_codes(tree: HuffmanTree) -> dict[int, tuple[int, int]]:
+    return {
+        symbol: (code, length)
+        for length, codes in tree._codes_by_length.items()
+        for code, symbol in codes.items()
+    }
+
+
+def huffman_bitstream(symbols: list[int], codes: dict[int, tuple[int, int]]) -> bytes:
+    """
+    Pack Huffman codes the way deflate does: codes most significant bit
+    first, into bytes filled from the least significant bit
+    """
+    value = 0
+    bit_count = 0
+    for symbol in symbols:
+        code, length = codes[symbol]
+        reversed_code = int(format(code, "b").zfill(length)[::-1], 2)
+        value |= reversed_code << bit_count
+        bit_count += length
+    return value.to_bytes((bit_count + 7) // 8, "little")
+
+
+def bench_huffman(results: Results, num_symbols: int = 20000) -> None:
+    alphabet = tuple(range(len(LITERAL_LENGTHS)))
+    seconds = measure(lambda: HuffmanTree(alphabet, LITERAL_LENGTHS))
+    results["huffman/build"] = {"trees_per_s": 1 / seconds}
+
+    tree = HuffmanTree(alphabet, LITERAL_LENGTHS)
+    rng = random.Random(SEED)
+    symbols = [rng.randrange(len(alphabet)) for _ in range(num_symbols)]
+    stream = huffman_bitstream(symbols, canonical_codes(tree))
+
+    def decode():
+        bits = BitBuffer(stream)
+        for _ in range(num_symbols):
+            bits.read_huffman_code(tree)
+
+    seconds = measure(decode)
+    results["huffman/decode"] = {"symbols_per_s": num_symbols / seconds}
+
+
+def bench_crc(results: Results, size: int = 256 * 1024) -> None:
+    data = random_bytes(size, "low")
+    crc = Crc()
+    seconds = measure(lambda: crc.calculate(data))
+    results["crc/calculate"] = {"mb_per_s": size / seconds / MB}
+    seconds = measure(Crc)
+    results["crc/table"] = {"tables_per_s": 1 / seconds}
+
+
+def bench_chunk_order(results: Results, num_chunks: int = 10000) -> None:
+    """
+    Ordering checks for a file split into many IDAT chunks
+    """
+    names = ["IHDR", "PLTE", *["IDAT"] * num_chunks, "IEND"]
+
+    def validate():
+        validator = ChunkOrderValidator()
+        for name in names:
+            validator.add(name)
+
+    seconds = measure(validate)
+    results[f"chunk_order/{num_chunks}-idat"] = {"chunks_per_s": len(names) / seconds}
+
+
+def run(results: Results, quick: bool = False) -> None:
+    bench_png_decode(results, sizes=(64,) if quick else (64, 256))
+    bench_png_encode(results, size=64 if quick else 256)
+    bench_png_probe(results, count=50 if quick else 200)
+    bench_decode_many(results, size=64 if quick else 128)
+    bench_image_cache(results, size=64 if quick else 256)
+    bench_zlib_decompress(results, size=16 * 1024 if quick else 64 * 1024)
+    bench_zlib_compress(results, size=16 * 1024 if quick else 64 * 1024)
+    bench_huffman(results)
+    bench_crc(results, size=64 * 1024 if quick else 256 * 1024)
+    bench_chunk_order(results, num_chunks=1000 if quick else 10000)
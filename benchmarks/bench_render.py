@@ -0,0 +1,60 @@
+import os
+
+from benchmarks.fake_curses import CountingWindow
+from benchmarks.fixtures import Scene, scenes
+from benchmarks.harness import Results, measure
+from ConsoleGraphicsEngine import VirtualCanvas
+from HeadlessWindow import HeadlessWindow
+from PngCodec import PngDecoder
+
+SPRITE = PngDecoder(os.path.join(os.path.dirname(__file__), "..", "car.png"), verbose=False)
+
+COLOR = (200, 40, 40)
+
+
+def draw_scene(canvas: VirtualCanvas, scene: Scene) -> None:
+    for x, y, radius in scene.circles:
+        canvas.draw_circle(x, y, radius, COLOR)
+    for x, y, width, height in scene.boxes:
+        canvas.draw_box(x, y, width, height, COLOR)
+    for x, y in scene.sprites:
+        canvas.add_sprite(x, y, SPRITE)
+
+
+def bench_canvas(results: Results, height: int = 50, width: int = 200) -> None:
+    window = CountingWindow(height, width)
+    canvas = VirtualCanvas(window)
+    for scene in scenes(width, height):
+        # Count the work for a single frame
+        window.reset_counts()
+        draw_scene(canvas, scene)
+        calls, cells = window.total_calls, window.cells
+
+        seconds = measure(lambda: draw_scene(canvas, scene))
+        results[f"canvas/{scene.name}"] = {
+            "frames_per_s": 1 / seconds,
+            "cells_per_s": cells / seconds,
+            "cells_per_frame": cells,
+            "calls_per_frame": calls,
+        }
+
+
+def bench_headless(results: Results, height: int = 50, width: int = 200) -> None:
+    """
+    Full rendering into HeadlessWindow's cell arrays, plus the cost of
+    dumping a frame
+    """
+    window = HeadlessWindow(height, width)
+    canvas = VirtualCanvas(window)
+    for scene in scenes(width, height):
+        seconds = measure(lambda: draw_scene(canvas, scene))
+        results[f"headless/{scene.name}"] = {"frames_per_s": 1 / seconds}
+
+    for dump in (window.to_text, window.to_ansi, window.to_image):
+        seconds = measure(dump)
+        results[f"headless/{dump.__name__}"] = {"frames_per_s": 1 / seconds}
+
+
+def run(results: Results, quick: bool = False) -> None:
+    bench_canvas(results)
+    bench_headless(results)
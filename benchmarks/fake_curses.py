@@ -0,0 +1,70 @@
+from collections import Counter
+
+
+class CountingWindow:
+    """
+    Headless stand-in for curses.window that only records what was asked of
+    it: the number of calls per method and the number of cells touched.
+
+    It advertises itself as a truecolor screen so VirtualCanvas.add_sprite
+    passes colors straight through instead of going through curses' global
+    palette functions, which need a real terminal.
+    """
+
+    truecolor = True
+
+    def __init__(self, height: int = 50, width: int = 200) -> None:
+        self.height = height
+        self.width = width
+        self.cursor = (0, 0)
+        self.calls = Counter()
+        self.cells = 0
+
+    def reset_counts(self) -> None:
+        self.calls.clear()
+        self.cells = 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def getmaxyx(self) -> tuple[int, int]:
+        self.calls["getmaxyx"] += 1
+        return self.height, self.width
+
+    def getyx(self) -> tuple[int, int]:
+        self.calls["getyx"] += 1
+        return self.cursor
+
+    def move(self, y: int, x: int) -> None:
+        self.calls["move"] += 1
+        self.cursor = (y, x)
+
+    def chgat(self, y: int, x: int, num: int, attr) -> None:
+        self.calls["chgat"] += 1
+        self.cells += self.width - x if num < 0 else min(num, self.width - x)
+        self.cursor = (y, x)
+
+    def addstr(self, y: int, x: int, text: str, attr=None) -> None:
+        self.calls["addstr"] += 1
+        self.cells += len(text)
+        self.cursor = (y, x + len(text))
+
+    def insch(self, y: int, x: int, char: str, attr=None) -> None:
+        self.calls["insch"] += 1
+        self.cells += self.width - x
+        self.cursor = (y, x)
+
+    def delch(self, y: int, x: int) -> None:
+        self.calls["delch"] += 1
+        self.cells += self.width - x
+        self.cursor = (y, x)
+
+    def clear(self) -> None:
+        self.calls["clear"] += 1
+
+    def erase(self) -> None:
+        self.calls["erase"] += 1
+
+    def refresh(self) -> None:
+        self.calls["refresh"] += 1
@@ -0,0 +1,179 @@
+"""
+Generated benchmark inputs. PNGs are written with the stdlib zlib so the
+fixtures don't depend on the code being measured.
+"""
+
+import random
+import struct
+import zlib
+
+from dataclasses import dataclass
+
+from PngCodec import Iso
+
+SEED = 2023
+
+
+@dataclass(frozen=True)
+class PngFixture:
+    name: str
+    width: int
+    height: int
+    bit_depth: int
+    compressibility: str
+    data: bytes
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+def png_chunk(name: str, data: bytes) -> bytes:
+    name = name.encode(Iso.CHUNK_NAME_ENCODING)
+    crc = zlib.crc32(name + data)
+    return struct.pack("!I", len(data)) + name + data + struct.pack("!I", crc)
+
+
+def sample_rows(width: int, height: int, bit_depth: int, compressibility: str,
+                rng: random.Random) -> list[list[int]]:
+    """
+    Palette indices for each pixel:
+      - high: a single color
+      - medium: repeating diagonal stripes
+      - low: uniformly random indices
+    """
+    num_colors = 1 << bit_depth
+    match compressibility:
+        case "high":
+            return [[1 % num_colors] * width for _ in range(height)]
+        case "medium":
+            return [[(row + col // 4) % num_colors for col in range(width)]
+                    for row in range(height)]
+        case "low":
+            return [[rng.randrange(num_colors) for _ in range(width)]
+                    for _ in range(height)]
+    raise ValueError(f"unknown compressibility: {compressibility}")
+
+
+def encode_paletted_png(rows: list[list[int]], bit_depth: int) -> bytes:
+    height, width = len(rows), len(rows[0])
+    num_colors = 1 << bit_depth
+    palette = bytes(
+        channel
+        for i in range(num_colors)
+        for channel in ((i * 37) % 256, (i * 91) % 256, (i * 151) % 256)
+    )
+    alpha = bytes(0 if i == 0 else 255 for i in range(num_colors))
+
+    raw = bytearray()
+    samples_per_byte = 8 // bit_depth
+    for row in rows:
+        raw.append(0)  # filter type: none
+        for i in range(0, width, samples_per_byte):
+            byte = 0
+            for sample in row[i:i + samples_per_byte]:
+                byte = (byte << bit_depth) | sample
+            raw.append(byte)
+
+    header = struct.pack("!II5B", width, height, bit_depth, 3, 0, 0, 0)
+    return b"".join((
+        Iso.SIGNATURE,
+        png_chunk(Iso.IMAGE_HEADER, header),
+        png_chunk(Iso.PALETTE, palette),
+        png_chunk(Iso.TRANSPARENCY, alpha),
+        png_chunk(Iso.IMAGE_DATA, zlib.compress(bytes(raw), 9)),
+        png_chunk(Iso.IMAGE_TRAILER, b""),
+    ))
+
+
+def png_fixtures(sizes=(64, 256), bit_depths=(1, 4, 8),
+                 compressibilities=("high", "medium", "low")) -> list[PngFixture]:
+    rng = random.Random(SEED)
+    fixtures = []
+    for size in sizes:
+        for bit_depth in bit_depths:
+            for compressibility in compressibilities:
+                rows = sample_rows(size, size, bit_depth, compressibility, rng)
+                fixtures.append(PngFixture(
+                    name=f"{size}x{size}-{bit_depth}bit-{compressibility}",
+                    width=size,
+                    height=size,
+                    bit_depth=bit_depth,
+                    compressibility=compressibility,
+                    data=encode_paletted_png(rows, bit_depth),
+                ))
+    return fixtures
+
+
+def random_bytes(size: int, compressibility: str, rng: random.Random = None) -> bytes:
+    rng = rng or random.Random(SEED)
+    match compressibility:
+        case "high":
+            return bytes(size)
+        case "medium":
+            words = [rng.randbytes(rng.randrange(2, 12)) for _ in range(64)]
+            data = bytearray()
+            while len(data) < size:
+                data += rng.choice(words)
+            return bytes(data[:size])
+        case "low":
+            return rng.randbytes(size)
+    raise ValueError(f"unknown compressibility: {compressibility}")
+
+
+@dataclass(frozen=True)
+class Scene:
+    name: str
+    circles: tuple[tuple[float, float, int], ...] = ()  # center x, center y, radius
+    boxes: tuple[tuple[float, float, int, int], ...] = ()  # center x, center y, width, height
+    sprites: tuple[tuple[float, float], ...] = ()  # top left x, y
+
+
+def scenes(width: int, height: int, count: int = 50) -> list[Scene]:
+    """
+    Scenes in virtual canvas coordinates for a width x height screen
+    """
+    rng = random.Random(SEED)
+
+    def point():
+        return rng.uniform(0, width / 2), rng.uniform(0, height)
+
+    return [
+        Scene("circles", circles=tuple((*point(), rng.randrange(1, height // 2))
+                                       for _ in range(count))),
+        Scene("boxes", boxes=tuple((*point(), rng.randrange(1, 20), rng.randrange(1, 10))
+                                   for _ in range(count))),
+        Scene("sprites", sprites=tuple(point() for _ in range(count // 5))),
+    ]
+
+
+def parking_layouts(count: int, cars: int = 10, size: int = 6,
+                    rng: random.Random = None) -> list[list[str]]:
+    """
+    Random Rush Hour layouts as car ranges in grid notation, goal car first
+    on row 3 with the exit at the end of it. Some won't be solvable.
+    """
+    rng = rng or random.Random(SEED)
+    columns = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[:size]
+    layouts = []
+    while len(layouts) < count:
+        goal_left = rng.randrange(size - 2)
+        occupied = {(goal_left, 2), (goal_left + 1, 2)}
+        ranges = [f"{columns[goal_left]}-{columns[goal_left + 1]}3"]
+        for _ in range(cars * 4):
+            if len(ranges) > cars:
+                break
+            length = rng.choice((2, 2, 3))
+            horizontal = rng.random() < 0.5
+            col = rng.randrange(size - (length - 1 if horizontal else 0))
+            row = rng.randrange(size - (0 if horizontal else length - 1))
+            cells = {(col + i, row) if horizontal else (col, row + i) for i in range(length)}
+            if cells & occupied or horizontal and row == 2:
+                continue  # overlapping, or in line with the goal car
+            occupied |= cells
+            if horizontal:
+                ranges.append(f"{columns[col]}-{columns[col + length - 1]}{row + 1}")
+            else:
+                ranges.append(f"{columns[col]}{row + 1}-{row + length}")
+        layouts.append(ranges)
+    return layouts
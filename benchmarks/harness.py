@@ -0,0 +1,80 @@
+import json
+
+from contextlib import redirect_stdout
+from io import StringIO
+from time import perf_counter
+
+Results = dict[str, dict[str, float | str]]
+
+
+def measure(function, min_time: float = 0.2, repeat: int = 3) -> float:
+    """
+    Best time in seconds for one call of function. Each of the repeats runs
+    function enough times to take at least min_time seconds.
+    """
+    with redirect_stdout(StringIO()):  # keep decoder chatter out of the report
+        start = perf_counter()
+        function()
+        elapsed = perf_counter() - start
+        loops = max(1, int(min_time / elapsed)) if elapsed > 0 else 1000
+
+        best = elapsed
+        for _ in range(repeat):
+            start = perf_counter()
+            for _ in range(loops):
+                function()
+            best = min(best, (perf_counter() - start) / loops)
+    return best
+
+
+def is_higher_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def is_lower_better(metric: str) -> bool:
+    return metric.endswith("_per_frame")
+
+
+def save_baseline(path: str, results: Results) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load_baseline(path: str) -> Results:
+    with open(path) as file:
+        return json.load(file)
+
+
+def find_regressions(baseline: Results, results: Results,
+                     tolerance: float) -> list[str]:
+    """
+    Describe every metric that got worse than the baseline by more than
+    the tolerance (a fraction, e.g. 0.2 for 20%)
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                if "error" in metric and old is None and name in baseline:
+                    regressions.append(f"{name}: now fails with {value}")
+                continue
+            if is_higher_better(metric) and value < old * (1 - tolerance):
+                regressions.append(f"{name} {metric}: {old:.4g} -> {value:.4g}")
+            elif is_lower_better(metric) and value > old * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {old:.4g} -> {value:.4g}")
+    return regressions
+
+
+def format_results(results: Results) -> str:
+    lines = []
+    width = max(map(len, results), default=0)
+    for name, metrics in results.items():
+        parts = []
+        for metric, value in metrics.items():
+            if isinstance(value, float):
+                value = f"{value:,.4g}" if value < 1e4 else f"{value:,.0f}"
+            parts.append(f"{metric}={value}")
+        lines.append(f"{name.ljust(width)}  {'  '.join(parts)}")
+    return "\n".join(lines)
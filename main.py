@@ -1,5 +1,5 @@
 from typing import Self
-from BoardUtils import AlphanumericGrid, Range
+from BoardUtils import AlphanumericGrid, Bitboard, Location, Range
 
 
 class Car:
@@ -42,6 +42,13 @@ class Car:
 
 
 class ParkingLot:
+    """
+    Cars on a width x height board. Occupancy is kept as a Bitboard: each
+    car's cells are a bitmask computed once when it is added, and the lot
+    keeps the union of them, so collisions, free cells and moves are found
+    with bitwise operations instead of comparing cars pairwise.
+    """
+
     # Type annotations
     cars: list[Car]
     goal_car: Car
@@ -52,17 +59,89 @@ class ParkingLot:
         self.exit_location = AlphanumericGrid.parse_alphanumeric_coord(exit_location)
         self.goal_car = None
         self.cars = []
+        self.board = Bitboard(width, height)
+        self.occupied = 0
+        self._masks = {}  # id(car) -> mask of its cells
 
-    def add_car(self, new_car: Car, goal=True):
+    def add_car(self, new_car: Car, goal=False):
+        if not self.board.contains(new_car._range):
+            raise ValueError(f"Car {new_car} cannot fit into the parking lot")
         # Check that the new car does not collide with any of the existing cars
-        for parked_car in self.cars:
-            if new_car.does_intersect(parked_car):
-                raise ValueError(f"Car {new_car} cannot fit into the parking lot")
+        mask = self.board.mask(new_car._range)
+        if mask & self.occupied:
+            raise ValueError(f"Car {new_car} cannot fit into the parking lot")
 
         if goal:
-            if self.goal_car is not None:
+            if self.goal_car is None:
                 self.goal_car = new_car
             else:
                 raise ValueError("Goal car has already been set")
         else:
             self.cars.append(new_car)
+        self._masks[id(new_car)] = mask
+        self.occupied |= mask
+
+    def mask(self, car: Car) -> int:
+        return self._masks[id(car)]
+
+    def is_free(self, location: str | Location) -> bool:
+        if isinstance(location, str):
+            location = AlphanumericGrid.parse_alphanumeric_coord(location)
+        return not self.board.bit(location) & self.occupied
+
+    def free_locations(self) -> list[Location]:
+        return self.board.locations(self.board.free(self.occupied))
+
+    def is_solved(self) -> bool:
+        return (self.goal_car is not None and
+                bool(self.mask(self.goal_car) & self.board.bit(self.exit_location)))
+
+    def moves(self) -> list[tuple[Car, int]]:
+        """
+        Every legal move as (car, distance): cars slide along their length,
+        negative distances go left or up
+        """
+        moves = []
+        for car in self.all_cars():
+            mask = self.mask(car)
+            others = self.occupied & ~mask
+            size = mask.bit_count()
+            for direction in (-1, 1):
+                distance = direction
+                while True:
+                    if car.is_horizontal:
+                        moved = self.board.shift(mask, columns=distance)
+                    else:
+                        moved = self.board.shift(mask, rows=distance)
+                    if moved.bit_count() != size or moved & others:
+                        break  # off the board or blocked
+                    moves.append((car, distance))
+                    distance += direction
+        return moves
+
+    def move_car(self, car: Car, distance: int) -> Car:
+        """
+        Slide a car along its length, returning the car that replaces it
+        """
+        columns, rows = (distance, 0) if car.is_horizontal else (0, distance)
+        start, end = car._range.start, car._range.end
+        moved = Car(Range((start.column + columns, start.row + rows),
+                          (end.column + columns, end.row + rows)))
+        if not self.board.contains(moved._range):
+            raise ValueError(f"Car {moved} cannot fit into the parking lot")
+        mask = self.board.mask(moved._range)
+        old_mask = self._masks.pop(id(car))
+        if mask & (self.occupied & ~old_mask):
+            self._masks[id(car)] = old_mask
+            raise ValueError(f"Car {moved} cannot fit into the parking lot")
+
+        if car is self.goal_car:
+            self.goal_car = moved
+        else:
+            self.cars[self.cars.index(car)] = moved
+        self._masks[id(moved)] = mask
+        self.occupied = self.occupied & ~old_mask | mask
+        return moved
+
+    def all_cars(self) -> list[Car]:
+        return self.cars if self.goal_car is None else [self.goal_car, *self.cars]
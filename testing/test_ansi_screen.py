@@ -0,0 +1,59 @@
+import os
+
+from AnsiScreen import AnsiScreen
+from ConsoleOutput import ConsoleOutput
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def render(screen: AnsiScreen, read_fd: int) -> bytes:
+    screen.refresh()
+    os.set_blocking(read_fd, False)
+    try:
+        return os.read(read_fd, 1 << 16)
+    except BlockingIOError:
+        return b""
+
+
+class TestAnsiScreen:
+    def setup_method(self):
+        self.read_fd, write_fd = os.pipe()
+        self.output = ConsoleOutput(write_fd)
+        self.screen = AnsiScreen(3, 8, self.output)
+
+    def teardown_method(self):
+        os.close(self.read_fd)
+        os.close(self.output.fd)
+
+    def test_first_frame(self):
+        self.screen.chgat(1, 2, 3, RED)
+        self.screen.chgat(1, 5, 1, BLUE)
+        assert render(self.screen, self.read_fd) == (
+            b"\x1b[0m\x1b[2J"  # initial clear
+            b"\x1b[2;3H\x1b[38;2;255;0;0;48;2;255;0;0m   "  # style set once for the run
+            b"\x1b[38;2;0;0;255;48;2;0;0;255m \x1b[0m"
+        )
+
+    def test_only_changes_are_sent(self):
+        self.screen.chgat(0, 0, 4, RED)
+        render(self.screen, self.read_fd)
+        assert render(self.screen, self.read_fd) == b""
+
+        self.screen.chgat(0, 0, 4, RED)  # unchanged
+        self.screen.addstr(0, 6, "ab")
+        self.screen.addstr(2, 0, "c")
+        assert render(self.screen, self.read_fd) == b"\x1b[1;7Hab\x1b[3Hc"
+
+    def test_cursor_moves_are_minimized(self):
+        render(self.screen, self.read_fd)
+        self.screen.addstr(0, 0, "a")
+        self.screen.addstr(0, 3, "b")
+        self.screen.addstr(1, 0, "c")
+        assert render(self.screen, self.read_fd) == b"\x1b[1Ha\x1b[2Cb\r\nc"
+
+    def test_curses_pairs(self):
+        self.screen.init_pair(1, 7, 0)
+        assert self.screen.style(1 << 8) == (7, 0)
+        assert self.screen.style(2 << 8) == (2, 2)
+        assert self.screen.style(0) == (None, None)
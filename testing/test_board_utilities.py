@@ -1,4 +1,6 @@
-from BoardUtils import AlphanumericGrid
+import pytest
+
+from BoardUtils import AlphanumericGrid, Bitboard, Location
 
 
 class TestAlphanumericGrid:
@@ -18,3 +20,17 @@ class TestAlphanumericGrid:
         for expected_input, expected_output in expected.items():
             output = AlphanumericGrid.parse_range(expected_input)
             assert output == expected_output, f"Incorrect value for '{expected_input}'"
+
+
+class TestBitboard:
+    def test_masks_and_shifts(self):
+        board = Bitboard(4, 3)
+        car = board.mask(AlphanumericGrid.parse_range("C-D2"))
+        assert car == 0b1100 << 4
+        assert board.shift(car, columns=1) == 0b1000 << 4  # D2 falls off the edge
+        assert board.shift(car, columns=-2) == 0b0011 << 4
+        assert board.shift(car, rows=1) == 0b1100 << 8
+        assert board.shift(car, rows=2) == 0
+        assert board.locations(board.free(board.full & ~car)) == [Location(2, 1), Location(3, 1)]
+        with pytest.raises(ValueError):
+            board.mask(AlphanumericGrid.parse_range("D-E1"))
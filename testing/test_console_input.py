@@ -0,0 +1,103 @@
+from ConsoleInput import (
+    EventCoalescer,
+    InputParser,
+    KeyEvent,
+    Modifier,
+    MouseAction,
+    MouseButton,
+    MouseEvent,
+    RingBuffer,
+    SpecialKey,
+)
+
+
+def parse(*chunks: bytes) -> list:
+    parser = InputParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.events.drain()
+
+
+class TestRingBuffer:
+    def test_fifo_order(self):
+        ring = RingBuffer(capacity=2)
+        ring.push(1)
+        ring.push(2)
+        assert ring.pop() == 1
+        ring.push(3)
+        ring.push(4)  # wraps around, then grows
+        ring.push(5)
+        assert len(ring) == 4
+        assert ring.drain() == [2, 3, 4, 5]
+        assert len(ring) == 0
+
+
+class TestEventCoalescer:
+    def test_merges_consecutive_motion(self):
+        def motion(x): return MouseEvent(x, 0, MouseButton.NONE, MouseAction.MOTION)
+        press = MouseEvent(3, 0, MouseButton.LEFT, MouseAction.PRESS)
+        release = MouseEvent(5, 0, MouseButton.LEFT, MouseAction.RELEASE)
+
+        coalescer = EventCoalescer()
+        events = [motion(1), motion(2), press, motion(3), motion(4), motion(5),
+                  release, KeyEvent('q'), motion(6)]
+        assert coalescer.coalesce(events) == [
+            motion(2), press, motion(5), release, KeyEvent('q'), motion(6)
+        ]
+        assert coalescer.received == 9
+        assert coalescer.coalesced == 3
+
+
+class TestInputParser:
+    def test_text(self):
+        assert parse(b"hi\xc3\xa9") == [KeyEvent('h'), KeyEvent('i'), KeyEvent('é')]
+
+    def test_control_keys(self):
+        assert parse(b"\r\t\x7f\x03") == [
+            KeyEvent(SpecialKey.ENTER),
+            KeyEvent(SpecialKey.TAB),
+            KeyEvent(SpecialKey.BACKSPACE),
+            KeyEvent('c', Modifier.CTRL),
+        ]
+
+    def test_csi_and_ss3_keys(self):
+        assert parse(b"\x1b[A\x1b[1;5C\x1b[3~\x1bOP\x1b[Z") == [
+            KeyEvent(SpecialKey.UP),
+            KeyEvent(SpecialKey.RIGHT, Modifier.CTRL),
+            KeyEvent(SpecialKey.DELETE),
+            KeyEvent(SpecialKey.F1),
+            KeyEvent(SpecialKey.TAB, Modifier.SHIFT),
+        ]
+
+    def test_alt_chord(self):
+        assert parse(b"\x1bb") == [KeyEvent('b', Modifier.ALT)]
+
+    def test_sgr_mouse(self):
+        assert parse(b"\x1b[<0;10;5M\x1b[<0;10;5m\x1b[<35;1;1M\x1b[<65;3;4M") == [
+            MouseEvent(9, 4, MouseButton.LEFT, MouseAction.PRESS),
+            MouseEvent(9, 4, MouseButton.LEFT, MouseAction.RELEASE),
+            MouseEvent(0, 0, MouseButton.NONE, MouseAction.MOTION),
+            MouseEvent(2, 3, MouseButton.WHEEL_DOWN, MouseAction.PRESS),
+        ]
+
+    def test_sequences_split_across_reads(self):
+        assert parse(b"\x1b", b"[<2;4", b";7M\x1b[", b"B") == [
+            MouseEvent(3, 6, MouseButton.RIGHT, MouseAction.PRESS),
+            KeyEvent(SpecialKey.DOWN),
+        ]
+
+    def test_lone_escape_is_flushed(self):
+        parser = InputParser()
+        parser.feed(b"\x1b")
+        assert parser.pending
+        assert len(parser.events) == 0
+        parser.flush()
+        assert not parser.pending
+        assert parser.events.drain() == [KeyEvent(SpecialKey.ESC)]
+
+    def test_motion_flood(self):
+        flood = b"".join(b"\x1b[<35;%d;%dM" % (x, x) for x in range(1, 501))
+        events = parse(flood)
+        assert len(events) == 500
+        assert all(event.is_motion for event in events)
+        assert events[-1] == MouseEvent(499, 499, MouseButton.NONE, MouseAction.MOTION)
@@ -0,0 +1,43 @@
+import os
+
+from ConsoleInput import ConsoleInput, MouseCode
+from ConsoleOutput import ConsoleOutput
+
+
+def read_all(fd: int) -> bytes:
+    return os.read(fd, 1 << 16)
+
+
+class TestConsoleOutput:
+    def test_commands_are_buffered_until_flush(self):
+        read_fd, write_fd = os.pipe()
+        out = ConsoleOutput(write_fd)
+        out.move_cursor(0, 4)
+        out.set_foreground((255, 0, 10))
+        out.set_background(17)
+        out.write("hi")
+        out.reset_attributes()
+        assert os.get_blocking(read_fd)
+        os.set_blocking(read_fd, False)
+        try:
+            read_all(read_fd)
+            assert False, "nothing should be written before flush"
+        except BlockingIOError:
+            pass
+
+        out.flush()
+        assert read_all(read_fd) == b"\x1b[1;5H\x1b[38;2;255;0;10m\x1b[48;5;17mhi\x1b[0m"
+        assert len(out.buffer) == 0
+        os.close(read_fd)
+        os.close(write_fd)
+
+    def test_mouse_modes_are_batched(self):
+        read_fd, write_fd = os.pipe()
+        console = ConsoleInput(fd=read_fd, output=ConsoleOutput(write_fd))
+        console.enable_mouse(MouseCode.ALL, MouseCode.AS_DECIMAL)
+        assert read_all(read_fd) == b"\x1b[?1003h\x1b[?1006h"
+
+        console.disable_mouse_reporting()
+        assert read_all(read_fd) == b"\x1b[?1006l\x1b[?1003l"
+        os.close(read_fd)
+        os.close(write_fd)
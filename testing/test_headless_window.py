@@ -0,0 +1,56 @@
+import numpy as np
+
+from ConsoleGraphicsEngine import SpritePlayer, VirtualCanvas
+from HeadlessWindow import HeadlessWindow
+
+RED = (255, 0, 0)
+
+
+class TestHeadlessWindow:
+    def test_text(self):
+        window = HeadlessWindow(2, 6)
+        window.addstr(0, 1, "hello")
+        window.insch(0, 1, ">")
+        window.delch(0, 5)
+        window.addstr(1, 4, "wrap")  # nowhere to wrap to, clipped at the end
+        assert window.to_text() == " >hel \n    wr"
+        assert window.getyx() == (1, 5)
+
+    def test_canvas_rendering(self):
+        window = HeadlessWindow(5, 10)
+        canvas = VirtualCanvas(window)
+        canvas.draw_box(2, 2, 3, 3, RED)
+
+        image = window.to_image()
+        assert image.shape == (5, 10, 4)
+        painted = window.has_background.nonzero()
+        assert set(zip(*painted)) == {(y, x) for y in range(1, 4) for x in range(2, 8)}
+        assert tuple(image[2, 4]) == (255, 0, 0, 255)
+        assert tuple(image[0, 0]) == (*HeadlessWindow.DEFAULT_BACKGROUND, 255)
+        assert window.to_image(cell_width=2, cell_height=3).shape == (15, 20, 4)
+
+    def test_ansi(self):
+        window = HeadlessWindow(2, 3)
+        window.chgat(0, 1, 2, RED)
+        window.init_pair(1, 7, 4)
+        window.addstr(1, 0, "ok", 1 << 8)
+        assert window.to_ansi() == (
+            " \x1b[38;2;255;0;0;48;2;255;0;0m  "
+            "\n\x1b[38;2;229;229;229;48;2;0;0;238mok\x1b[39;49m "
+        )
+
+    def test_sprite_player(self):
+        red = np.zeros((2, 2, 4), dtype=np.uint8)
+        red[...] = (*RED, 255)
+        blue = red.copy()
+        blue[0, 0] = (0, 0, 255, 255)
+        blue[1, 1, 3] = 0
+
+        window = HeadlessWindow(4, 8)
+        player = SpritePlayer(VirtualCanvas(window), [red, blue], 1, 1)
+        assert player.advance() == SpritePlayer.DEFAULT_DELAY
+        assert player.show(1) == 2  # only the changed pixels are repainted
+        assert tuple(window.to_image()[1, 2]) == (0, 0, 255, 255)
+        assert tuple(window.to_image()[1, 4]) == (255, 0, 0, 255)
+        assert not window.has_background[2, 4:6].any()
+        assert player.show(1) == 0
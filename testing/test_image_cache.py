@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import numpy as np
+
+import ImageCache as image_cache_module
+from ImageCache import ImageCache
+from PngCodec import PngDecoder
+
+CAR = os.path.join(os.path.dirname(__file__), "..", "car.png")
+
+
+class TestImageCache:
+    def test_warm_load_skips_decoding(self, tmp_path, monkeypatch):
+        cache = ImageCache(tmp_path / "cache")
+        cold = cache.load(CAR)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("cached image was decoded again")
+        monkeypatch.setattr(image_cache_module, "PngDecoder", fail)
+
+        warm = cache.load(CAR)
+        assert isinstance(warm, np.memmap)
+        assert np.array_equal(warm, cold)
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_modified_file_is_decoded_again(self, tmp_path):
+        sprite = tmp_path / "sprite.png"
+        shutil.copy(CAR, sprite)
+        cache = ImageCache(tmp_path / "cache")
+        cache.load(sprite)
+
+        os.utime(sprite, ns=(0, 0))
+        assert np.array_equal(cache.load(sprite), PngDecoder(CAR).image)
+        assert cache.misses == 2
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        sprites = []
+        for i in range(3):
+            sprites.append(tmp_path / f"sprite{i}.png")
+            shutil.copy(CAR, sprites[-1])
+
+        entry_size = PngDecoder(CAR).image.nbytes + 128  # .npy header
+        cache = ImageCache(tmp_path / "cache", max_bytes=2 * entry_size)
+        cache.load(sprites[0])
+        cache.load(sprites[1])
+        os.utime(cache._entry_path(cache.key(sprites[0])), ns=(1, 1))
+        os.utime(cache._entry_path(cache.key(sprites[1])), ns=(2, 2))
+        cache.load(sprites[2])
+
+        entries = os.listdir(tmp_path / "cache")
+        assert len(entries) == 2
+        assert os.path.basename(cache._entry_path(cache.key(sprites[0]))) not in entries
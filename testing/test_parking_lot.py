@@ -1,3 +1,6 @@
+import pytest
+
+from BoardUtils import Location
 from main import Car, ParkingLot
 
 
@@ -43,3 +46,33 @@ class TestMain:
 
         sample_board = ParkingLot(sample_width, sample_height, sample_exit_location)
         sample_board.add_car(sample_goal_car, goal=True)
+        for car in sample_car_list:
+            sample_board.add_car(car)
+
+        with pytest.raises(ValueError):
+            sample_board.add_car(Car('B4-5'))  # B5 is taken
+        with pytest.raises(ValueError):
+            sample_board.add_car(Car('F5-6'), goal=True)
+
+        assert sample_board.free_locations() == [Location(1, 3), Location(5, 4)]
+        assert sample_board.is_free('B4') and not sample_board.is_free('B3')
+        moves = {(repr(car), distance) for car, distance in sample_board.moves()}
+        assert moves == {("Car(Range(Point(1, 4), Point(1, 5)))", -1),
+                         ("Car(Range(Point(3, 4), Point(4, 4)))", 1)}
+
+        moved = sample_board.move_car(sample_car_list[4], -1)  # B5-6 up
+        assert sample_board.is_free('B6') and not sample_board.is_free('B4')
+        assert moved in sample_board.cars and not sample_board.is_solved()
+        with pytest.raises(ValueError):
+            sample_board.move_car(moved, -1)
+
+    def test_solved(self):
+        board = ParkingLot(4, 4, 'D2')
+        goal_car = Car('A-B2')
+        board.add_car(goal_car, goal=True)
+        board.add_car(Car('D1-2'))
+        assert board.moves() == [(goal_car, 1), (board.cars[0], 1), (board.cars[0], 2)]
+        assert not board.is_solved()
+        board.move_car(board.cars[0], 2)
+        board.move_car(goal_car, 2)
+        assert board.is_solved()
@@ -0,0 +1,333 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import png_chunk, png_fixtures, random_bytes
+from PngCodec import (
+    ApngBlend,
+    ApngDispose,
+    ChunkOrderValidator,
+    Deflater,
+    Iso,
+    PngDecoder,
+    PngEncoder,
+    PngFilter,
+    decode_many,
+    limited_code_lengths,
+    zlib_compress,
+    zlib_decompress,
+)
+
+CAR = os.path.join(os.path.dirname(__file__), "..", "car.png")
+
+
+def write_fixtures(directory, **kwargs) -> list[str]:
+    paths = []
+    for fixture in png_fixtures(**kwargs):
+        path = os.path.join(directory, f"{fixture.name}.png")
+        with open(path, "wb") as file:
+            file.write(fixture.data)
+        paths.append(path)
+    return paths
+
+
+class TestDecodeMany:
+    def test_matches_sequential_decoding(self, tmp_path):
+        paths = [CAR, *write_fixtures(tmp_path, sizes=(64,), bit_depths=(8,),
+                                      compressibilities=("high", "medium")), CAR]
+        images = decode_many(paths, workers=2)
+        try:
+            assert len(images) == len(paths)
+            for path, shared in zip(paths, images):
+                expected = PngDecoder(path).image
+                assert (shared.width, shared.height) == (expected.shape[1], expected.shape[0])
+                assert np.array_equal(shared.image, expected)
+        finally:
+            for shared in images:
+                shared.close()
+
+
+class TestPngDecoder:
+    def test_compact_pixel_views(self):
+        png = PngDecoder(CAR)
+        assert "pixels" not in vars(png)
+
+        rows, cols = png.opaque_coordinates
+        assert len(rows) == np.count_nonzero(png.image[..., 3])
+        assert png.opaque_mask[rows[0], cols[0]]
+
+        packed = png.packed_colors
+        assert packed.shape == (png.height, png.width)
+        assert packed[rows[0], cols[0]] == png.image[rows[0], cols[0]].view(np.uint32)[0]
+
+        pixels = png.pixels
+        assert len(pixels) == len(rows)
+        row, col = rows[-1], cols[-1]
+        assert pixels[row, col] == tuple(png.image[row, col].tolist())
+
+
+def apng(path, frames, num_plays=0) -> None:
+    """
+    Write a 4x4 paletted APNG whose first frame is the default image.
+    frames: (x, y, rows of palette indices, dispose_op, blend_op)
+    """
+    palette = bytes((0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255))
+    alpha = bytes((0, 255, 255, 255))
+
+    def compress(rows):
+        return zlib.compress(b"".join(b"\0" + bytes(row) for row in rows))
+
+    chunks = [
+        (Iso.IMAGE_HEADER, struct.pack("!II5B", 4, 4, 8, 3, 0, 0, 0)),
+        (Iso.ANIMATION_CONTROL, struct.pack("!II", len(frames), num_plays)),
+        (Iso.PALETTE, palette),
+        (Iso.TRANSPARENCY, alpha),
+    ]
+    sequence = 0
+    for i, (x, y, rows, dispose, blend) in enumerate(frames):
+        control = struct.pack("!5I2H2B", sequence, len(rows[0]), len(rows), x, y,
+                              i + 1, 10, dispose, blend)
+        chunks.append((Iso.FRAME_CONTROL, control))
+        sequence += 1
+        if i == 0:
+            chunks.append((Iso.IMAGE_DATA, compress(rows)))
+        else:
+            chunks.append((Iso.FRAME_DATA, struct.pack("!I", sequence) + compress(rows)))
+            sequence += 1
+    chunks.append((Iso.IMAGE_TRAILER, b""))
+
+    with open(path, "wb") as file:
+        file.write(Iso.SIGNATURE + b"".join(png_chunk(name, data) for name, data in chunks))
+
+
+class TestApng:
+    RED = (255, 0, 0, 255)
+    GREEN = (0, 255, 0, 255)
+    BLUE = (0, 0, 255, 255)
+    CLEAR = (0, 0, 0, 0)
+
+    def expected(self, overrides):
+        image = np.array([[self.RED] * 4] * 4, dtype=np.uint8)
+        for (row, col), color in overrides.items():
+            image[row, col] = color
+        return image
+
+    def test_dispose_and_blend(self, tmp_path):
+        path = tmp_path / "anim.png"
+        apng(path, [
+            (0, 0, [[1] * 4] * 4, ApngDispose.NONE, ApngBlend.SOURCE),
+            (1, 1, [[2, 0], [0, 2]], ApngDispose.BACKGROUND, ApngBlend.OVER),
+            (0, 0, [[3]], ApngDispose.PREVIOUS, ApngBlend.SOURCE),
+            (3, 3, [[0]], ApngDispose.NONE, ApngBlend.SOURCE),
+        ])
+        png = PngDecoder(path)
+        animation = png.animation
+        assert png.is_animated and len(animation) == 4
+        assert animation.delays == [0.1, 0.2, 0.3, 0.4]
+
+        center = {(1, 1): self.CLEAR, (1, 2): self.CLEAR,
+                  (2, 1): self.CLEAR, (2, 2): self.CLEAR}
+        expected = [
+            self.expected({}),
+            self.expected({(1, 1): self.GREEN, (2, 2): self.GREEN}),
+            self.expected({**center, (0, 0): self.BLUE}),
+            self.expected({**center, (3, 3): self.CLEAR}),
+        ]
+        assert np.array_equal(animation[0], png.image)
+
+        # Random access, with a cache too small to hold anything
+        animation.cache_bytes = 0
+        for index in (3, 1, 2, 0, 3, 2):
+            assert np.array_equal(animation[index], expected[index]), index
+
+        # Frames are cached within the budget
+        animation.cache_bytes = 2 * png.image.nbytes
+        animation[1], animation[2], animation[3]
+        assert sorted(animation._cache) == [2, 3]
+        assert animation[2] is animation[2]
+
+
+class TestPngEncoder:
+    def image(self, height=12, width=10):
+        rng = np.random.default_rng(0)
+        image = np.zeros((height, width, 4), dtype=np.uint8)
+        image[..., 0] = np.arange(width) * 20  # smooth, so filters have work to do
+        image[..., 1] = np.arange(height)[:, None] * 15
+        image[..., 2] = rng.integers(0, 256, (height, width))
+        image[..., 3] = rng.choice((0, 128, 255), (height, width))
+        return image
+
+    def round_trip(self, tmp_path, encoder):
+        path = tmp_path / "image.png"
+        encoder.save(path)
+        return PngDecoder(path)
+
+    def test_truecolor(self, tmp_path):
+        image = self.image()
+        for filters in (*PngFilter, PngEncoder.ADAPTIVE):
+            for level in (0, 1, 9):
+                png = self.round_trip(tmp_path, PngEncoder(image, filters=filters, level=level))
+                assert png.color_type == 6
+                assert np.array_equal(png.image, image), (filters, level)
+
+        opaque = image.copy()
+        opaque[..., 3] = 255
+        png = self.round_trip(tmp_path, PngEncoder(opaque))
+        assert png.color_type == 2 and np.array_equal(png.image, opaque)
+
+    def test_adaptive_filters(self):
+        image = self.image(32, 32)
+        image[..., 2] = image[..., 0]
+        filters = PngEncoder(image).filtered_scanlines()[:, 0]
+        assert filters[0] in (PngFilter.SUB, PngFilter.PAETH)  # nothing above the first row
+        assert (filters != PngFilter.NONE).all()
+
+    def test_fast_decode_profile(self, tmp_path):
+        image = self.image()
+        image[..., 2] = 7  # few enough colors for a palette
+        encoder = PngEncoder.fast_decode(image)
+        assert encoder.color_type == 3 and encoder.level == 0
+
+        scanlines = encoder.filtered_scanlines()
+        assert not scanlines[:, 0].any()
+        png = self.round_trip(tmp_path, encoder)
+        assert png.color_type == 3 and np.array_equal(png.image, image)
+
+        # Too many colors for a palette
+        png = self.round_trip(tmp_path, PngEncoder.fast_decode(self.image(40, 40)))
+        assert png.color_type == 6
+
+    def test_paletted(self, tmp_path):
+        palette = [(0, 0, 0, 0), (255, 0, 0, 255), (0, 0, 255, 128)]
+        indices = np.array([[0, 1, 2], [2, 1, 0]])
+        png = self.round_trip(tmp_path, PngEncoder(indices, palette))
+        assert png.alpha_samples == (0, 255, 128)
+        assert np.array_equal(png.image, np.array(palette, dtype=np.uint8)[indices])
+
+        with pytest.raises(ValueError):
+            PngEncoder(indices, palette[:2])
+
+
+class TestDeflate:
+    def inputs(self):
+        return [b"", b"a", b"abc" * 1000, bytes(70000),
+                random_bytes(40000, "medium"), random_bytes(5000, "low")]
+
+    def test_round_trip(self):
+        for data in self.inputs():
+            for level in (0, 1, 6, 9):
+                compressed = zlib_compress(data, level)
+                assert zlib.decompress(compressed) == data, (len(data), level)
+                if len(data) <= 5000:
+                    assert zlib_decompress(compressed) == data, (len(data), level)
+
+    def test_ratio_close_to_zlib(self):
+        data = random_bytes(40000, "medium")
+        assert len(zlib_compress(data, 6)) <= len(zlib.compress(data, 6)) * 1.05
+
+    def test_streaming(self):
+        data = random_bytes(100000, "medium")
+        deflater = Deflater(level=4, max_chain=8)
+        compressed = b"".join(deflater.compress(data[i:i + 3000])
+                              for i in range(0, len(data), 3000))
+        compressed += deflater.flush()
+        assert zlib.decompress(compressed) == data
+        with pytest.raises(ValueError):
+            deflater.compress(b"more")
+
+    def test_length_limited_codes(self):
+        fibonacci = [1, 1]
+        while len(fibonacci) < 30:
+            fibonacci.append(fibonacci[-1] + fibonacci[-2])
+        lengths = limited_code_lengths(fibonacci, 15)
+        assert max(lengths) == 15
+        assert sum(2 ** -length for length in lengths) == 1  # complete prefix code
+        assert limited_code_lengths([0, 5, 0], 7) == [0, 1, 0]
+
+    def test_encoder_with_pure_python_deflate(self, tmp_path):
+        image = TestPngEncoder().image()
+        path = tmp_path / "image.png"
+        PngEncoder(image, compressor=zlib_compress).save(path)
+        assert np.array_equal(PngDecoder(path).image, image)
+
+
+class TestChunkOrder:
+    def test_rules(self):
+        validator = ChunkOrderValidator()
+        for name in ("IHDR", "sRGB", "PLTE", "tRNS", "IDAT", "IDAT"):
+            validator.add(name)
+
+        assert not validator.can_add("iCCP")  # conflicts with sRGB
+        assert not validator.can_add("tRNS")  # must precede IDAT, not repeat
+        validator.add("tEXt")
+        with pytest.raises(Iso.ChunkError, match="consecutive"):
+            validator.check("IDAT")
+        validator.add("IEND")
+        with pytest.raises(Iso.ChunkError, match="last chunk"):
+            validator.check("tEXt")
+
+        with pytest.raises(Iso.ChunkError, match="required"):
+            ChunkOrderValidator().check("IEND")
+        assert Iso.can_parse_chunk("PLTE", ["IHDR", "bKGD"]) is False  # bKGD after PLTE
+        assert Iso.can_parse_chunk("IDAT", ["IHDR", "PLTE"])
+
+    def test_many_image_data_chunks(self, tmp_path):
+        path = tmp_path / "split.png"
+        image = TestPngEncoder().image(64, 64)
+        encoded = PngEncoder(image, filters=PngFilter.NONE, level=0).encode()
+
+        # Re-split the image data into 1-byte IDAT chunks
+        header, image_data = encoded[:33], bytearray()
+        position = 33
+        while position < len(encoded):
+            length, = struct.unpack_from("!I", encoded, position)
+            name = encoded[position + 4:position + 8]
+            if name == b"IDAT":
+                image_data += encoded[position + 8:position + 8 + length]
+            position += length + 12
+        chunks = [png_chunk(Iso.IMAGE_DATA, image_data[i:i + 1]) for i in range(len(image_data))]
+        with open(path, "wb") as file:
+            file.write(header + b"".join(chunks) + png_chunk(Iso.IMAGE_TRAILER, b""))
+
+        png = PngDecoder(path, check_crc=False)
+        assert png.chunks_read.count(Iso.IMAGE_DATA) == len(image_data) > 16000
+        assert np.array_equal(png.image, image)
+
+
+class TestProbe:
+    def write(self, path, garbage_after_header=False) -> np.ndarray:
+        image = TestPngEncoder().image()
+        encoded = PngEncoder(image).encode()
+        time = struct.pack("!H5B", 2023, 5, 6, 7, 8, 9)
+        metadata = (png_chunk(Iso.IMAGE_LAST_MODIFICATION_TIME, time) +
+                    png_chunk(Iso.TEXTUAL_DATA, b"Title\0car"))
+        header_end = len(Iso.SIGNATURE) + 25
+        rest = encoded[header_end:]
+        if garbage_after_header:
+            rest = rest[:8] + bytes(len(rest) - 8)  # keep only the first IDAT's name
+        with open(path, "wb") as file:
+            file.write(encoded[:header_end] + metadata + rest)
+        return image
+
+    def test_metadata_only(self, tmp_path, capsys):
+        path = tmp_path / "image.png"
+        self.write(path, garbage_after_header=True)
+        png = PngDecoder.probe(path)  # never reads past the first IDAT
+        assert (png.width, png.height, png.color_type) == (10, 12, 6)
+        assert png.time_last_modified.year == 2023 and png.text == {"Title": "car"}
+        assert png.chunks_read == [Iso.IMAGE_HEADER, Iso.IMAGE_LAST_MODIFICATION_TIME,
+                                   Iso.TEXTUAL_DATA]
+        assert not png.is_animated
+        assert capsys.readouterr().out == ""
+
+    def test_image_decoded_on_first_access(self, tmp_path):
+        path = tmp_path / "image.png"
+        image = self.write(path)
+        png = PngDecoder(path, lazy=True, verbose=False)
+        assert Iso.IMAGE_DATA not in png.chunks_read
+        assert np.array_equal(png.image, image)
+        assert png.chunks_read[-1] == Iso.IMAGE_TRAILER
+        assert png.image is png.image
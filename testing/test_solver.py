@@ -0,0 +1,97 @@
+from collections import deque
+
+import pytest
+
+from main import Car, ParkingLot
+from Solver import PuzzleSpace, solve
+
+# A 51 move puzzle, goal car first
+HARD_PUZZLE = ['D-E3', 'B-C1', 'A-C4', 'E-F5', 'A-B6', 'D-E6', 'A1-3',
+               'B2-3', 'C2-3', 'C5-6', 'D4-5', 'E1-2', 'F2-4']
+UNSOLVABLE_PUZZLE = ['B-C3', 'A1-2', 'A3-4', 'A5-6', 'B1-2', 'B5-6', 'C4-5', 'C-D1', 'C-D2',
+                     'C-D6', 'D3-4', 'D-E5', 'E2-3', 'E-F1', 'E-F4', 'E-F6', 'F2-3']
+
+
+def parking_lot(width: int, height: int, exit_location: str, ranges: list[str]) -> ParkingLot:
+    lot = ParkingLot(width, height, exit_location)
+    goal_range, *other_ranges = ranges
+    lot.add_car(Car(goal_range), goal=True)
+    for car_range in other_ranges:
+        lot.add_car(Car(car_range))
+    return lot
+
+
+class TestSolver:
+    def test_shortest_solution(self):
+        lot = parking_lot(4, 4, 'D2', ['A-B2', 'D1-2', 'C3-4'])
+        solution = solve(lot)
+        assert solution.moves == ((1, 2), (0, 2))  # blocker down, then goal car out
+        solution.apply(lot)
+        assert lot.is_solved()
+
+    def test_hard_puzzle(self):
+        lot = parking_lot(6, 6, 'F3', HARD_PUZZLE)
+        solution = solve(lot)
+        assert len(solution) == 51
+        assert solution.states_explored <= len(explore(PuzzleSpace(lot)))
+        solution.apply(lot)
+        assert lot.is_solved()
+
+    def test_unsolvable(self):
+        lot = parking_lot(6, 6, 'F3', UNSOLVABLE_PUZZLE)
+        solution = solve(lot)
+        assert not solution.solvable and solution.moves is None
+        assert solution.states_explored == len(explore(PuzzleSpace(lot)))
+
+    @pytest.mark.parametrize("method", ["astar", "idastar"])
+    def test_heuristic_search(self, method):
+        lot = parking_lot(6, 6, 'F3', HARD_PUZZLE)
+        solution = solve(lot, method)
+        assert len(solution) == 51
+        assert solution.nodes_expanded > 0
+        solution.apply(lot)
+        assert lot.is_solved()
+
+        lot = parking_lot(6, 6, 'F3', UNSOLVABLE_PUZZLE)
+        assert not solve(lot, method).solvable
+
+    def test_small_transposition_table(self):
+        lot = parking_lot(6, 6, 'F3', ['B-C3', 'D-E2', 'C-D6', 'A5-6', 'C-D5', 'B4-6', 'F4-5',
+                                       'D3-4', 'A3-4', 'C1-2', 'E-F6', 'D-F1', 'B1-2'])
+        solution = solve(lot, "idastar", table_size=64)
+        assert len(solution) == len(solve(lot)) == 8
+        solution.apply(lot)
+        assert lot.is_solved()
+
+        # Too small to hold every state, so it can't prove there's no solution
+        lot = parking_lot(6, 6, 'F3', UNSOLVABLE_PUZZLE)
+        assert not solve(lot, "idastar", table_size=16, max_moves=10).solvable
+
+    def test_heuristic_is_admissible(self):
+        space = PuzzleSpace(parking_lot(6, 6, 'F3', HARD_PUZZLE))
+        # Moves can be undone, so distances to the goal are distances from it
+        states = explore(space)
+        distances = {state: 0 for state in states if space.is_goal(state)}
+        frontier = deque(distances)
+        while frontier:
+            state = frontier.popleft()
+            for next_state, _ in space.neighbours(state):
+                if next_state not in distances:
+                    distances[next_state] = distances[state] + 1
+                    frontier.append(next_state)
+        assert all(space.heuristic(state) <= distance for state, distance in distances.items())
+        assert space.heuristic(space.initial) > 1
+
+
+def explore(space: PuzzleSpace):
+    """
+    Every reachable state, by depth-first search
+    """
+    seen = {space.initial}
+    stack = [space.initial]
+    while stack:
+        for next_state, _ in space.neighbours(stack.pop()):
+            if next_state not in seen:
+                seen.add(next_state)
+                stack.append(next_state)
+    return seen
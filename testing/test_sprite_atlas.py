@@ -0,0 +1,54 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ConsoleGraphicsEngine import VirtualCanvas
+from HeadlessWindow import HeadlessWindow
+from SpriteAtlas import AtlasFrame, SpriteAtlas
+
+CAR = os.path.join(os.path.dirname(__file__), "..", "car.png")
+
+
+def sheet(height: int, width: int) -> np.ndarray:
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    image[..., 0] = np.arange(width)  # red encodes the column
+    image[..., 1] = np.arange(height)[:, None]  # green encodes the row
+    image[..., 3] = 255
+    return image
+
+
+class TestSpriteAtlas:
+    def test_frames_are_views(self):
+        atlas = SpriteAtlas(sheet(4, 6), [AtlasFrame("a", 1, 2, 3, 2)])
+        frame = atlas["a"]
+        assert frame.shape == (2, 3, 4)
+        assert np.shares_memory(frame, atlas.image)
+        assert tuple(frame[0, 0, :2]) == (1, 2)
+
+    def test_grid(self):
+        atlas = SpriteAtlas.from_grid(sheet(9, 9), 3, 3, margin=1, spacing=1)
+        assert list(atlas) == ["0,0", "0,1", "1,0", "1,1"]
+        assert tuple(atlas["1,1"][0, 0, :2]) == (5, 5)
+
+        walk = SpriteAtlas.from_grid(sheet(2, 8), 2, 2, names=["walk0", "walk1", "idle"])
+        assert len(walk) == 3
+        assert [tuple(f[0, 0, :2]) for f in walk.sequence("walk")] == [(0, 0), (2, 0)]
+
+    def test_frames_must_fit(self):
+        with pytest.raises(ValueError):
+            SpriteAtlas(sheet(4, 4), [AtlasFrame("a", 2, 2, 3, 1)])
+
+    def test_json_sidecar(self, tmp_path):
+        sidecar = tmp_path / "car.json"
+        sidecar.write_text(json.dumps({"frames": {
+            "front": {"frame": {"x": 0, "y": 0, "w": 16, "h": 13}},
+            "back": {"x": 16, "y": 0, "w": 16, "h": 13},
+        }}))
+        atlas = SpriteAtlas.from_json(CAR, sidecar)
+        assert atlas["back"].shape == (13, 16, 4)
+
+        window = HeadlessWindow(13, 32)
+        VirtualCanvas(window).add_sprite(0, 0, atlas["front"])
+        assert np.array_equal(window.has_background[:, ::2], atlas["front"][..., 3] != 0)